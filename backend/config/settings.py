@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "django.middleware.gzip.GZipMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -143,6 +144,58 @@ CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS", default=[])
 # REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# Keyset pagination of the list endpoints: PAGE_SIZE rows unless the client
+# asks for ?page_size=, capped at MAX_PAGE_SIZE (PING_* for pings)
+PAGINATION = {
+    "PAGE_SIZE": env.int("PAGINATION_PAGE_SIZE", default=100),
+    "MAX_PAGE_SIZE": env.int("PAGINATION_MAX_PAGE_SIZE", default=1_000),
+    "PING_PAGE_SIZE": env.int("PAGINATION_PING_PAGE_SIZE", default=500),
+    "PING_MAX_PAGE_SIZE": env.int("PAGINATION_PING_MAX_PAGE_SIZE", default=5_000),
+}
+
+# Ingest queue
+# When enabled, POST /api/subscriber-pings/ answers 202 after an enqueue and
+# writer threads flush pings in batches; a full queue answers 429.
+INGEST_QUEUE = {
+    "ENABLED": env.bool("INGEST_QUEUE_ENABLED", default=False),
+    "MAX_SIZE": env.int("INGEST_QUEUE_MAX_SIZE", default=50_000),
+    "BATCH_SIZE": env.int("INGEST_QUEUE_BATCH_SIZE", default=5_000),
+    "FLUSH_INTERVAL": env.float("INGEST_QUEUE_FLUSH_INTERVAL", default=1.0),
+    "WORKERS": env.int("INGEST_QUEUE_WORKERS", default=2),
+}
+
+# Inference cache
+# /infer/ responses are cached per subscriber, model and filters, in local
+# memory (LRU bounded by MAX_ENTRIES) or in Redis when URL is set.  Keys
+# hold the subscriber's pings_version, bumped in the database by every ping
+# write, so no process can read an entry older than the pings.
+INFERENCE_CACHE = {
+    "ENABLED": env.bool("INFERENCE_CACHE_ENABLED", default=True),
+    "URL": env.str("INFERENCE_CACHE_URL", default=""),
+    "TIMEOUT": env.int("INFERENCE_CACHE_TIMEOUT", default=300),
+    "MAX_ENTRIES": env.int("INFERENCE_CACHE_MAX_ENTRIES", default=1_000),
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "inference": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": INFERENCE_CACHE["URL"],
+        "TIMEOUT": INFERENCE_CACHE["TIMEOUT"],
+    } if INFERENCE_CACHE["URL"] else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "inference",
+        "TIMEOUT": INFERENCE_CACHE["TIMEOUT"],
+        "OPTIONS": {"MAX_ENTRIES": INFERENCE_CACHE["MAX_ENTRIES"]},
+    },
 }
 
 # DRF Spectacular
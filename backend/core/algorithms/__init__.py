@@ -1,4 +1,8 @@
 from .majority_vote import MajorityVoteModel
 from .clustering import ClusteringModel
+from .hmm import HMMModel
+from .sql_majority_vote import SqlMajorityVoteModel
+from .sql_clustering import SqlClusteringModel
+from .storage import RecomputeStats, recompute_intervals, stored_intervals, stored_timeline
 
 from .base import LocationInferenceModel 
\ No newline at end of file
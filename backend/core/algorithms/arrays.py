@@ -0,0 +1,236 @@
+"""
+Flat NumPy views of a ping set for the vectorized algorithms.
+
+A ping set is fetched with one query ordered by time, with the epoch and the
+coordinates computed by the database, and streamed straight into NumPy arrays
+(no model instances, dicts or GEOS points).  States are factorized into
+small integer codes (``-1`` for pings outside every state) so per-state
+counting is plain array arithmetic.  A batch of subscribers is loaded the
+same way, ordered by subscriber, and split on array boundaries.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.db.models import BigIntegerField, F, FloatField, Func
+
+from core.models import LocationInterval, Subscriber
+
+US_PER_SEC = 1_000_000
+
+FETCH_CHUNK = 50_000
+
+
+class EpochMicros(Func):
+    template = "(EXTRACT(EPOCH FROM %(expressions)s) * 1000000)::bigint"
+    output_field = BigIntegerField()
+
+
+class PointX(Func):
+    function = "ST_X"
+    output_field = FloatField()
+
+
+class PointY(Func):
+    function = "ST_Y"
+    output_field = FloatField()
+
+
+@dataclass
+class PingArrays:
+    times: np.ndarray                 # int64 µs since the epoch, ascending
+    codes: np.ndarray                 # int64 index into ``states``, -1 = no state
+    states: np.ndarray                # state code of every index
+    longitudes: Optional[np.ndarray] = None
+    latitudes: Optional[np.ndarray] = None
+    subscribers: Optional[np.ndarray] = None   # subscriber id, batches only
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def from_queryset(cls, pings, with_coords: bool = False,
+                      with_subscribers: bool = False) -> "PingArrays":
+        """
+        Loads ``pings`` with one streamed query; with ``with_subscribers``
+        they are ordered by subscriber first and ``times`` only ascend within
+        each subscriber.
+        """
+        order = ("subscriber_id", "utc_time", "pk") if with_subscribers else ("utc_time", "pk")
+        qs = pings.order_by(*order).annotate(_epoch=EpochMicros("utc_time"))
+        fields = ["_epoch", "state_id"]
+        dtype = [("time", np.int64), ("state", object)]
+        if with_subscribers:
+            fields.append("subscriber_id")
+            dtype.append(("subscriber", np.int64))
+        if with_coords:
+            qs = qs.annotate(_x=PointX(F("geom")), _y=PointY(F("geom")))
+            fields += ["_x", "_y"]
+            dtype += [("x", np.float64), ("y", np.float64)]
+        rows = np.fromiter(
+            qs.values_list(*fields).iterator(chunk_size=FETCH_CHUNK), dtype=dtype
+        )
+        codes, states = pd.factorize(rows["state"])
+        arrays = cls(rows["time"].copy(), codes.astype(np.int64), np.asarray(states, dtype=object))
+        if with_coords:
+            arrays.longitudes = rows["x"].copy()
+            arrays.latitudes = rows["y"].copy()
+        if with_subscribers:
+            arrays.subscribers = rows["subscriber"].copy()
+        return arrays
+
+    def slice(self, lo: int, hi: int) -> "PingArrays":
+        """
+        Returns pings ``[lo, hi)`` as views sharing ``states``.
+        """
+        def cut(values):
+            return values[lo:hi] if values is not None else None
+        return replace(self, times=self.times[lo:hi], codes=self.codes[lo:hi],
+                       longitudes=cut(self.longitudes), latitudes=cut(self.latitudes),
+                       subscribers=cut(self.subscribers))
+
+    def groups(self) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yields ``(subscriber_id, lo, hi)`` for every subscriber of a batch.
+        """
+        starts = run_starts(self.subscribers)
+        for lo, hi in zip(starts, np.r_[starts[1:], len(self)]):
+            yield int(self.subscribers[lo]), int(lo), int(hi)
+
+    def chunks(self, max_rows: int) -> Iterator[Tuple[int, int]]:
+        """
+        Yields ``[lo, hi)`` ranges of whole subscribers holding at most
+        ``max_rows`` pings (a larger subscriber is a chunk of its own).
+        """
+        starts = run_starts(self.subscribers) if self.subscribers is not None else np.zeros(1, np.int64)
+        bounds = np.r_[starts, len(self)]
+        i = 0
+        while i < len(bounds) - 1:
+            j = max(int(np.searchsorted(bounds, bounds[i] + max_rows, side="right")) - 1, i + 1)
+            yield int(bounds[i]), int(bounds[j])
+            i = j
+
+    def compact(self) -> "PingArrays":
+        """
+        Returns the arrays re-coded over only the states that occur.
+        """
+        located = self.codes >= 0
+        used, recoded = np.unique(self.codes[located], return_inverse=True)
+        codes = np.full(len(self), -1, dtype=np.int64)
+        codes[located] = recoded
+        return replace(self, codes=codes, states=self.states[used])
+
+    def group_starts(self) -> Optional[np.ndarray]:
+        """
+        Index of every ping's subscriber's first ping (``None`` when the
+        arrays hold a single subscriber).
+        """
+        if self.subscribers is None:
+            return None
+        starts = run_starts(self.subscribers)
+        return np.repeat(starts, np.diff(np.r_[starts, len(self)]))
+
+    def state_counts(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yields every state code with its cumulative count, shape ``(n + 1,)``:
+        item ``j`` holds how many of the first ``j`` pings fell in the state,
+        so any window ``[lo, hi)`` is counted by ``counts[hi] - counts[lo]``.
+        The same buffer is refilled for every state, so memory does not grow
+        with the number of states.
+        """
+        counts = np.zeros(len(self) + 1, dtype=np.int32)
+        for code in range(len(self.states)):
+            np.cumsum(self.codes == code, dtype=np.int32, out=counts[1:])
+            yield code, counts
+
+def run_starts(values: np.ndarray) -> np.ndarray:
+    """
+    Returns the index where every run of equal consecutive values starts.
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+
+
+def fill_gaps(codes: np.ndarray, group_starts: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Replaces ``-1`` codes by the previous known code (the next one at the
+    start), so pings outside every state never break a stay.  With
+    ``group_starts`` codes are only taken from the same subscriber.
+    """
+    known = codes >= 0
+    if known.all() or not known.any():
+        return codes
+    n = len(codes)
+    positions = np.arange(n)
+    if group_starts is None:
+        group_starts = np.zeros(n, dtype=np.int64)
+    source = np.where(known, positions, -1)
+    np.maximum.accumulate(source, out=source)
+    source[source < group_starts] = -1
+    lead = source < 0
+    if lead.any():
+        following = np.where(known, positions, n)
+        following = np.minimum.accumulate(following[::-1])[::-1]
+        same = (following < n) & (group_starts[np.minimum(following, n - 1)] == group_starts)
+        source = np.where(lead & same, following, source)
+    return np.where(source >= 0, codes[source], -1)
+
+
+def to_datetime(micros) -> "np.ndarray":
+    return np.asarray(micros, dtype=np.int64).astype("datetime64[us]").astype(object)
+
+
+def build_intervals(
+    subscriber: Subscriber,
+    method: int,
+    arrays: PingArrays,
+    codes: np.ndarray,
+    confidence: np.ndarray,
+) -> List[LocationInterval]:
+    """
+    Run-length encodes per-ping state ``codes`` into contiguous intervals.
+    Each interval ends where the next one starts (the last one at its last
+    ping); its confidence is the mean of its pings' ``confidence`` (0–1).
+    """
+    starts = run_starts(codes)
+    if len(starts) == 0:
+        return []
+    ends = np.r_[starts[1:], len(codes)]
+    counts = ends - starts
+    mean_confidence = np.add.reduceat(confidence, starts) / counts * 100
+    bounds = to_datetime(np.r_[arrays.times[starts], arrays.times[-1]])
+    intervals = []
+    for i, (start, count) in enumerate(zip(starts, counts)):
+        code = codes[start]
+        intervals.append(LocationInterval(
+            subscriber=subscriber,
+            interval_start=bounds[i],
+            interval_end=bounds[i + 1],
+            ping_count=int(count),
+            state_id=arrays.states[code] if code >= 0 else None,
+            confidence_pct=round(float(mean_confidence[i]), 2),
+            method=method,
+        ))
+    return intervals
+
+
+def window_bounds(times: np.ndarray, half_window: int,
+                  group_starts: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns ``[lo, hi)`` ping index ranges of the window centred on every ping.
+    With ``group_starts`` windows never reach into another subscriber.
+    """
+    if group_starts is not None:
+        # lay the subscribers out one after the other, further apart than a window
+        starts = np.flatnonzero(group_starts == np.arange(len(times)))
+        ends = np.r_[starts[1:], len(times)]
+        spans = times[ends - 1] - times[starts] + 2 * half_window + 1
+        shift = np.r_[0, np.cumsum(spans)[:-1]] - times[starts]
+        times = times + np.repeat(shift, ends - starts)
+    lo = np.searchsorted(times, times - half_window, side="left")
+    hi = np.searchsorted(times, times + half_window, side="right")
+    return lo, hi
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Type
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Type
 from rest_framework import serializers
 
 
@@ -10,6 +11,10 @@ from core.models import (
     Subscriber,
     SubscriberPing
 )
+from .arrays import PingArrays
+
+# [start, end) of the pings to use; either bound may be None
+TimeRange = Tuple[Optional[datetime], Optional[datetime]]
 
 
 class LocationInferenceModel(ABC):
@@ -40,11 +45,11 @@ class LocationInferenceModel(ABC):
             raise serializers.ValidationError(f"Unknown model_id={method_id}")
 
     @abstractmethod
-    def infer_intervals(self, subscriber: Subscriber, pings: List[SubscriberPing]) -> LocationInterval:
+    def infer_intervals(self, subscriber: Subscriber, pings: List[SubscriberPing]) -> List[LocationInterval]:
         """
         Concrete implementations build a **complete, non-overlapping timeline**
         for the given subscriber and return the unsaved `LocationInterval`
-        objects.
+        objects in time order (an empty list when there are no pings).
 
         Heavy data-crunching is left to subclasses; they may use Pandas,
         PostGIS SQL, scikit-learn, hmmlearn … whatever you prefer.
@@ -52,3 +57,74 @@ class LocationInferenceModel(ABC):
         raise NotImplementedError(
             f"{self.__class__.__name__} must implement `infer_intervals()`"
         )
+
+    def infer_many(
+        self,
+        subscriber_ids: Iterable[int],
+        time_range: Optional[TimeRange] = None,
+    ) -> Dict[int, List[LocationInterval]]:
+        """
+        Timelines of many subscribers, keyed by the ids of the subscribers
+        that exist.  The default calls `infer_intervals` once per subscriber;
+        array based models override it to load every ping with one query.
+        """
+        subscribers = Subscriber.objects.in_bulk(list(subscriber_ids))
+        return {
+            pk: self.infer_intervals(
+                subscriber, pings=self.pings_in_range(subscriber.pings.all(), time_range)
+            )
+            for pk, subscriber in subscribers.items()
+        }
+
+    @staticmethod
+    def pings_in_range(pings, time_range: Optional[TimeRange]):
+        if time_range is None:
+            return pings
+        start, end = time_range
+        if start is not None:
+            pings = pings.filter(utc_time__gte=start)
+        if end is not None:
+            pings = pings.filter(utc_time__lt=end)
+        return pings
+
+    def load_many(
+        self,
+        subscriber_ids: Iterable[int],
+        time_range: Optional[TimeRange] = None,
+        with_coords: bool = False,
+    ):
+        """
+        Returns the subscribers by id and all their pings as one batch of
+        ``PingArrays``, fetched with a single ordered query.
+        """
+        subscribers = Subscriber.objects.in_bulk(list(subscriber_ids))
+        pings = self.pings_in_range(
+            SubscriberPing.objects.filter(subscriber_id__in=list(subscribers)), time_range
+        )
+        return subscribers, PingArrays.from_queryset(
+            pings, with_coords=with_coords, with_subscribers=True
+        )
+
+    def summarize(self, intervals: List[LocationInterval]) -> Optional[LocationInterval]:
+        """
+        Collapses a timeline into one interval spanning it: the state holding
+        the most pings, with the ping-weighted mean confidence.
+        """
+        if not intervals:
+            return None
+        pings_per_state: Dict[Optional[str], int] = {}
+        for interval in intervals:
+            pings_per_state[interval.state_id] = (
+                pings_per_state.get(interval.state_id, 0) + interval.ping_count
+            )
+        total = sum(interval.ping_count for interval in intervals)
+        confidence = sum(float(i.confidence_pct) * i.ping_count for i in intervals)
+        return LocationInterval(
+            subscriber=intervals[0].subscriber,
+            interval_start=intervals[0].interval_start,
+            interval_end=intervals[-1].interval_end,
+            ping_count=total,
+            state_id=max(pings_per_state, key=lambda s: (s is not None, pings_per_state[s])),
+            confidence_pct=round(confidence / total, 2) if total else 0,
+            method=self.method_id,
+        )
@@ -1,12 +1,28 @@
-from typing import List
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
 
-from django.contrib.gis.db import models
 import numpy as np
-import pandas as pd
 from sklearn.cluster import DBSCAN
 
 from core.models import Subscriber, SubscriberPing, LocationInterval
-from .base import LocationInferenceModel
+from .arrays import US_PER_SEC, PingArrays, fill_gaps, to_datetime
+from .base import LocationInferenceModel, TimeRange
+
+
+@dataclass
+class ClusterRuns:
+    """
+    Parallel arrays describing clusters (or merged runs of clusters) in
+    time order; times are µs since the epoch, states are ``PingArrays`` codes.
+    """
+    start: np.ndarray
+    end: np.ndarray
+    state: np.ndarray
+    size: np.ndarray
+    confidence: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.start)
 
 
 class ClusteringModel(LocationInferenceModel):
@@ -21,86 +37,140 @@ class ClusteringModel(LocationInferenceModel):
     SHORT_SWITCH_SEC = 180   # merge flips shorter than this
 
     def infer_intervals(self, subscriber: Subscriber, pings: List[SubscriberPing]):
-        qs = (
-            pings
-            .values("utc_time", "geom", "state_id")
-            .order_by("utc_time")
-        )
-        if not qs.exists():
-            return None
-
-        df = pd.DataFrame([
-            {
-                "utc_time": ping["utc_time"],
-                "latitude": ping["geom"].y,
-                "longitude": ping["geom"].x,
-                "state_id": ping["state_id"]
-            } for ping in qs
-            ])
+        return self.cluster(subscriber, PingArrays.from_queryset(pings, with_coords=True))
+
+    def infer_many(self, subscriber_ids: Iterable[int],
+                   time_range: Optional[TimeRange] = None) -> Dict[int, List[LocationInterval]]:
+        """
+        Loads every subscriber's pings with one query and clusters each
+        subscriber's slice of the arrays.
+        """
+        subscribers, arrays = self.load_many(subscriber_ids, time_range, with_coords=True)
+        timelines: Dict[int, List[LocationInterval]] = {pk: [] for pk in subscribers}
+        for pk, lo, hi in arrays.groups():
+            timelines[pk] = self.cluster(subscribers[pk], arrays.slice(lo, hi))
+        return timelines
+
+    def cluster(self, subscriber: Subscriber, arrays: PingArrays) -> List[LocationInterval]:
+        if not len(arrays):
+            return []
+
         # -------------------------------------------------------------
         # 1. DBSCAN in Haversine space
-        coords_rad = np.radians(df[["latitude", "longitude"]].values)
-        db = DBSCAN(
+        coords_rad = np.radians(np.column_stack((arrays.latitudes, arrays.longitudes)))
+        labels = DBSCAN(
             eps=self.EPS_METERS / 6_371_000,  # convert m → radians
             min_samples=self.MIN_SAMPLES,
             metric="haversine",
-        ).fit(coords_rad)
-        df["cluster"] = db.labels_
+        ).fit(coords_rad).labels_
+        # noise points are clusters of their own, not one cluster spanning everything
+        noise = labels < 0
+        labels[noise] = labels.max() + 1 + np.arange(noise.sum())
 
         # -------------------------------------------------------------
-        # 2. summarize cluster → centroid & duration
-        summary = (
-            df.groupby("cluster")
-            .agg(
-                min_time=("utc_time", "min"),
-                max_time=("utc_time", "max"),
-                state_mode=("state_id", lambda x: x.value_counts().index[0]),
-                spatial_conf=("state_id", lambda x: round((x.value_counts().iloc[0] / len(x)) * 100, 2)),
-            )
-            .sort_values("min_time")
-        )
-        summary["temporal_conf"] = (
-            (summary["max_time"] - summary["min_time"]).dt.total_seconds()
-            / (summary["max_time"].shift(-1).fillna(summary["max_time"]) - summary["min_time"])
-            .dt.total_seconds()
-        ).fillna(1).mul(100).round(2)
-
-        summary["confidence"] = ((summary["spatial_conf"] + summary["temporal_conf"]) / 2).round(2)
+        # 2. summarize cluster → time span, state & confidence
+        summary = self.cluster_summary(arrays, labels)
 
         # -------------------------------------------------------------
         # 3. merge short flips
-        intervals = []
-        current = None
-        for row in summary.itertuples():
-            if current is None:
-                current = row
-                continue
-            gap = (row.min_time - current.max_time).total_seconds()
-            if row.state_mode == current.state_mode or gap < self.SHORT_SWITCH_SEC:
-                # extend the current interval
-                current = current._replace(max_time=row.max_time,
-                                           confidence=max(current.confidence, row.confidence))
-            else:
-                intervals.append(current)
-                current = row
-        if current:
-            intervals.append(current)
+        runs = self.merge_flips(summary)
 
         # -------------------------------------------------------------
-        # 4. build a single LocationInterval object
-        if not summary.empty:
-            min_time = summary["min_time"].min()
-            max_time = summary["max_time"].max()
-            state_mode = summary["state_mode"].mode()[0] if not summary["state_mode"].empty else None
-            confidence = max(0, min(100, summary["confidence"].max()))
-            return  LocationInterval(
-                    subscriber=subscriber,
-                    interval_start=min_time,
-                    interval_end=max_time,
-                    state_id=state_mode,
-                    confidence_pct=confidence,
-                    method=self.method_id,
-                    ping_count=len(pings),
-                )
-
-        return None
+        # 4. one LocationInterval per run
+        return self.run_intervals(subscriber, runs, arrays.states)
+
+    def run_intervals(self, subscriber: Subscriber, runs: ClusterRuns,
+                      states: np.ndarray) -> List[LocationInterval]:
+        """
+        One ``LocationInterval`` per run, clipped so runs never overlap;
+        ``states`` maps the runs' state codes to state ids.
+        """
+        end = np.r_[np.minimum(runs.end[:-1], runs.start[1:]), runs.end[-1:]]
+        starts, ends = to_datetime(runs.start), to_datetime(end)
+        confidence = np.clip(runs.confidence, 0, 100)
+        return [
+            LocationInterval(
+                subscriber=subscriber,
+                interval_start=starts[i],
+                interval_end=ends[i],
+                state_id=states[runs.state[i]] if runs.state[i] >= 0 else None,
+                confidence_pct=round(float(confidence[i]), 2),
+                method=self.method_id,
+                ping_count=int(runs.size[i]),
+            )
+            for i in range(len(runs))
+        ]
+
+    @staticmethod
+    def cluster_summary(arrays: PingArrays, labels: np.ndarray) -> ClusterRuns:
+        """
+        Time span, modal state and confidence of every cluster, sorted by
+        start time.
+        """
+        n = len(arrays)
+        cluster_ids, cluster = np.unique(labels, return_inverse=True)
+        # pings are in time order, so a stable sort keeps each cluster sorted
+        order = np.argsort(cluster, kind="stable")
+        firsts = np.flatnonzero(np.r_[True, np.diff(cluster[order]) != 0])
+        lasts = np.r_[firsts[1:], n] - 1
+        start = arrays.times[order[firsts]]
+        end = arrays.times[order[lasts]]
+        size = lasts - firsts + 1
+
+        # modal state: count (cluster, state) pairs, keep the largest per cluster
+        k = max(len(arrays.states), 1)
+        located = arrays.codes >= 0
+        pairs, counts = np.unique(cluster[located] * k + arrays.codes[located],
+                                  return_counts=True)
+        by_count = np.lexsort((-counts, pairs // k))
+        pairs, counts = pairs[by_count], counts[by_count]
+        best = np.r_[True, np.diff(pairs // k) != 0]
+        state = np.full(len(cluster_ids), -1, dtype=np.int64)
+        state_count = np.zeros(len(cluster_ids), dtype=np.int64)
+        state[pairs[best] // k] = pairs[best] % k
+        state_count[pairs[best] // k] = counts[best]
+        return ClusteringModel.score_clusters(start, end, size, state, state_count)
+
+    @staticmethod
+    def score_clusters(start: np.ndarray, end: np.ndarray, size: np.ndarray,
+                       state: np.ndarray, state_count: np.ndarray) -> ClusterRuns:
+        """
+        Sorts clusters by start time and scores them from their first and
+        last ping time, size, modal state code (-1 for none) and modal state
+        count.  Spatial confidence is the modal state's share of the cluster;
+        temporal confidence is the cluster's share of the time until the next
+        cluster ends.
+        """
+        spatial = np.round(state_count / size * 100, 2)
+
+        by_start = np.argsort(start, kind="stable")
+        start, end = start[by_start], end[by_start]
+        # clusters outside every state follow the previous cluster
+        state = fill_gaps(state[by_start])
+        size, spatial = size[by_start], spatial[by_start]
+        next_end = np.r_[end[1:], end[-1:]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            temporal = (end - start) / (next_end - start)
+        temporal = np.round(np.nan_to_num(temporal, nan=1.0) * 100, 2)
+        confidence = np.round((spatial + temporal) / 2, 2)
+        return ClusterRuns(start, end, state, size, confidence)
+
+    def merge_flips(self, summary: ClusterRuns) -> ClusterRuns:
+        """
+        Folds every cluster into the preceding run when it starts less than
+        ``SHORT_SWITCH_SEC`` after the previous cluster ended, or when it has
+        the run's state.  Only clusters after a long gap can open a run, and
+        they open one exactly when their state differs from the previous
+        such cluster's, which makes the merge a run-length encoding.
+        """
+        gaps = summary.start[1:] - summary.end[:-1]
+        candidates = np.flatnonzero(np.r_[True, gaps >= self.SHORT_SWITCH_SEC * US_PER_SEC])
+        candidate_state = summary.state[candidates]
+        runs = candidates[np.r_[True, candidate_state[1:] != candidate_state[:-1]]]
+        return ClusterRuns(
+            start=summary.start[runs],
+            end=np.maximum.reduceat(summary.end, runs),
+            state=summary.state[runs],
+            size=np.add.reduceat(summary.size, runs),
+            confidence=np.maximum.reduceat(summary.confidence, runs),
+        )
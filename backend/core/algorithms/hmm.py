@@ -0,0 +1,159 @@
+from math import ceil, sqrt
+from typing import List
+
+import numpy as np
+
+from core.ingestion.locator import get_state_locator
+from core.models import Subscriber, SubscriberPing, LocationInterval
+from .arrays import US_PER_SEC, PingArrays, build_intervals, fill_gaps
+from .base import LocationInferenceModel
+
+KM_PER_DEGREE = 111.32
+
+
+def _step(x: np.ndarray, stay: np.ndarray, move: np.ndarray, emit: np.ndarray) -> np.ndarray:
+    """
+    One max-plus step, in place, through a transition matrix that is ``stay``
+    on the diagonal and ``move <= stay`` elsewhere, followed by the emission
+    ``emit``.  The batch is the last axis and the state the one before, so
+    ``x`` holds ``(k, batch)`` vectors or ``(k, k, batch)`` transfer matrices.
+    """
+    moved = x.max(axis=-2, keepdims=True)
+    moved += move
+    x += stay
+    np.maximum(x, moved, out=x)
+    x += emit
+    return x
+
+
+def maxplus_scan(first: np.ndarray, stay: np.ndarray, move: np.ndarray,
+                 emit: np.ndarray) -> np.ndarray:
+    """
+    Returns ``v`` of shape ``(k, len(stay) + 1)`` with ``v[:, 0] = first`` and
+    ``v[j, t] = max(v[j, t-1] + stay[t-1], max(v[:, t-1]) + move[t-1])
+    + emit[j, t-1]``, each column shifted to a max of 0.
+
+    The sequence is cut in about √n blocks handled side by side: the
+    block transfer matrices are accumulated for all blocks at once, chained
+    across blocks, and the columns are then filled in for all blocks at once.
+    Python only loops ~3√n times, every iteration working on all blocks.
+    """
+    steps, k = len(stay), len(first)
+    out = np.empty((k, steps + 1))
+    out[:, 0] = first - first.max()
+    if steps == 0:
+        return out
+    length = ceil(sqrt(steps))
+    blocks = ceil(steps / length)
+    # steps past the end are identities: stay 0, move -inf, no emission;
+    # step s of every block is one contiguous row, blocks on the last axis
+    pad = blocks * length - steps
+    stay = np.r_[stay, np.zeros(pad)].reshape(blocks, length).T.copy()
+    move = np.r_[move, np.full(pad, -np.inf)].reshape(blocks, length).T.copy()
+    emit = np.ascontiguousarray(
+        np.pad(emit, ((0, 0), (0, pad))).reshape(k, blocks, length).transpose(2, 0, 1)
+    )
+
+    identity = np.where(np.eye(k, dtype=bool), 0.0, -np.inf)
+    transfer = np.repeat(identity[:, :, None], blocks, axis=2)
+    for s in range(length):
+        _step(transfer, stay[s], move[s], emit[s])
+    transfer = transfer.transpose(2, 0, 1).copy()
+
+    starts = np.empty((blocks, k))
+    starts[0] = out[:, 0]
+    for b in range(1, blocks):
+        row = (starts[b - 1][:, None] + transfer[b - 1]).max(axis=0)
+        starts[b] = row - row.max()
+
+    # within a block the scores drift by at most ~√n steps, harmless in float64
+    columns = np.empty((length, k, blocks))
+    current = starts.T.copy()
+    for s in range(length):
+        columns[s] = _step(current, stay[s], move[s], emit[s])
+    out[:, 1:] = columns.transpose(1, 2, 0).reshape(k, -1)[:, :steps]
+    out -= out.max(axis=0)
+    return out
+
+
+class HMMModel(LocationInferenceModel):
+    """
+    Approach 3 – hidden Markov model over the states seen in the pings.
+
+    A ping is a noisy emission of the true state: it reports its own state
+    with a probability that falls from 1 towards ``1 - BORDER_CONFUSION``
+    as it gets closer to a border (scale ``BORDER_KM``).  Between pings the
+    subscriber moves to a random state at rate ``1 / DWELL_SEC``, so the
+    longer the gap the more likely a change of state.
+    Decoding combines forward Viterbi scores with backward scores, both
+    computed by max-plus scans, and takes the best state of every ping.
+    """
+    method_id = LocationInterval.Method.HMM
+    name = "Bayesian HMM"
+
+    BORDER_KM = 2.0
+    BORDER_CONFUSION = 0.5
+    DWELL_SEC = 2 * 3600
+    MIN_LOG = np.log(1e-12)
+
+    def infer_intervals(self, subscriber: Subscriber, pings: List[SubscriberPing]):
+        arrays = PingArrays.from_queryset(pings, with_coords=True)
+        if not len(arrays):
+            return []
+        if len(arrays.states) < 2:
+            return build_intervals(subscriber, self.method_id, arrays,
+                                   fill_gaps(arrays.codes), np.ones(len(arrays)))
+        border_km = get_state_locator().border_distance(
+            arrays.longitudes, arrays.latitudes
+        ) * KM_PER_DEGREE
+        path, confidence = self.decode(arrays, border_km)
+        return build_intervals(subscriber, self.method_id, arrays, path, confidence)
+
+    def emissions(self, codes: np.ndarray, k: int, border_km: np.ndarray) -> np.ndarray:
+        """
+        Log probability of every ping's observed state under each hidden
+        state, shape ``(k, n)``.
+        """
+        miss = self.BORDER_CONFUSION * np.exp(-border_km / self.BORDER_KM)
+        hit = np.log1p(-miss)
+        with np.errstate(divide="ignore"):
+            other = np.maximum(np.log(miss / (k - 1)), self.MIN_LOG)
+        log_e = np.repeat(other[None, :], k, axis=0)
+        located = codes >= 0
+        log_e[codes[located], np.flatnonzero(located)] = hit[located]
+        log_e[:, ~located] = -np.log(k)
+        return log_e
+
+    def transitions(self, times: np.ndarray, k: int):
+        """
+        Log probabilities of staying and of moving to one given other state
+        between consecutive pings: the subscriber jumps with rate
+        ``1 / DWELL_SEC`` to a uniformly chosen state (possibly its own).
+        """
+        dt = np.diff(times) / US_PER_SEC
+        move = -np.expm1(-dt / self.DWELL_SEC) / k
+        log_stay = np.log1p(-(k - 1) * move)
+        with np.errstate(divide="ignore"):
+            log_move = np.maximum(np.log(move), self.MIN_LOG)
+        return log_stay, log_move
+
+    def decode(self, arrays: PingArrays, border_km: np.ndarray):
+        """
+        Returns the decoded state code of every ping and the share of the
+        max-marginal probability mass that code holds.
+        """
+        n, k = len(arrays), len(arrays.states)
+        log_e = self.emissions(arrays.codes, k, border_km)
+        log_stay, log_move = self.transitions(arrays.times, k)
+        delta = maxplus_scan(log_e[:, 0] - np.log(k), log_stay, log_move, log_e[:, 1:])
+        # backward scores with the emission folded in, scanned from the end
+        beta = maxplus_scan(log_e[:, -1], log_stay[::-1], log_move[::-1],
+                            log_e[:, -2::-1])[:, ::-1] - log_e
+        scores = delta + beta
+        best = scores.max(axis=0)
+        # first best state of every ping; reductions stay along contiguous rows
+        path = np.zeros(n, dtype=np.int64)
+        for code in range(k - 1, -1, -1):
+            path[scores[code] == best] = code
+        confidence = 1 / np.exp(scores - best).sum(axis=0)
+        return path, confidence
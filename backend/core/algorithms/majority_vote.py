@@ -1,5 +1,6 @@
-from typing import List
-from django.db.models import Count
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
 
 from core.models import (
     Subscriber,
@@ -7,44 +8,76 @@ from core.models import (
     LocationInterval,
 )
 
-from .base import LocationInferenceModel
+from .arrays import US_PER_SEC, PingArrays, build_intervals, fill_gaps, window_bounds
+from .base import LocationInferenceModel, TimeRange
 
 
 class MajorityVoteModel(LocationInferenceModel):
     """
-    Approach 1 – sliding-window majority vote (see earlier explanation).
+    Approach 1 – sliding-window majority vote.
+
+    Every ping takes the state most seen within ``WINDOW_SEC`` around it
+    (window counts come from cumulative per-state counts, so the cost does
+    not depend on the window size); runs of equal votes become intervals.
+    States are counted one at a time, so a batch of ``BATCH_ROWS`` pings
+    needs a few arrays of that length however many states it spans.
     """
     method_id = LocationInterval.Method.MAJORITY_VOTE
     name = "Majority vote"
 
+    WINDOW_SEC = 3600
+    BATCH_ROWS = 1_000_000   # pings voted at once by infer_many
+
+    def __init__(self, window_sec: Optional[int] = None):
+        if window_sec is not None:
+            self.WINDOW_SEC = window_sec
+
     def infer_intervals(self, subscriber: Subscriber, pings: List[SubscriberPing]):
-        qs = (
-            pings
-            .values("utc_time", "state_id")
-            .order_by("utc_time")
-        )
-
-        if not qs.exists():
-            return None
-        
-        # Group by state_id and count occurrences
-        state_counts = (
-            qs
-            .values('state_id')
-            .annotate(count=Count('state_id'))
-            .order_by('-count')
-        )
-        majority_state = state_counts[0]['state_id'] if state_counts else None
-        confidence = state_counts[0]['count'] / qs.count() * 100 if qs.count() > 0 else 0
-
-        # build objects
-        location = LocationInterval(
-            subscriber=subscriber,
-            interval_start=qs[0]['utc_time'],
-            interval_end=qs.last()['utc_time'],
-            ping_count=qs.count(),
-            state_id=majority_state,
-            confidence_pct=confidence,
-            method=self.method_id,
-        )
-        return location
+        arrays = PingArrays.from_queryset(pings)
+        if not len(arrays):
+            return []
+        votes, confidence = self.vote(arrays)
+        return build_intervals(subscriber, self.method_id, arrays, votes, confidence)
+
+    def infer_many(self, subscriber_ids: Iterable[int],
+                   time_range: Optional[TimeRange] = None) -> Dict[int, List[LocationInterval]]:
+        """
+        Loads every subscriber's pings with one query and votes on
+        ``BATCH_ROWS`` pings of many subscribers at a time.
+        """
+        subscribers, arrays = self.load_many(subscriber_ids, time_range)
+        timelines: Dict[int, List[LocationInterval]] = {pk: [] for pk in subscribers}
+        for lo, hi in arrays.chunks(self.BATCH_ROWS):
+            chunk = arrays.slice(lo, hi).compact()
+            votes, confidence = self.vote(chunk)
+            for pk, start, end in chunk.groups():
+                timelines[pk] = build_intervals(
+                    subscribers[pk], self.method_id, chunk.slice(start, end),
+                    votes[start:end], confidence[start:end],
+                )
+        return timelines
+
+    def vote(self, arrays: PingArrays):
+        """
+        Returns every ping's voted state code and the share of its window's
+        pings that voted for it.  Windows of a batch stay within their
+        subscriber.
+        """
+        if not len(arrays.states):
+            return arrays.codes, np.zeros(len(arrays))
+        group_starts = arrays.group_starts()
+        lo, hi = window_bounds(arrays.times, self.WINDOW_SEC * US_PER_SEC // 2, group_starts)
+        # one state at a time, keeping the best count so far: a few arrays of
+        # n items whatever the number of states (ties go to the lowest code)
+        votes = np.zeros(len(arrays), dtype=np.int64)
+        best = np.zeros(len(arrays), dtype=np.int32)
+        window = np.empty(len(arrays), dtype=np.int32)
+        before = np.empty(len(arrays), dtype=np.int32)
+        for code, counts in arrays.state_counts():
+            np.take(counts, hi, out=window)
+            np.subtract(window, np.take(counts, lo, out=before), out=window)
+            better = window > best
+            votes[better] = code
+            np.copyto(best, window, where=better)
+        votes = fill_gaps(np.where(best > 0, votes, -1), group_starts)
+        return votes, best / (hi - lo)
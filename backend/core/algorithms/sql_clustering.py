@@ -0,0 +1,93 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from core.models import Subscriber, SubscriberPing, LocationInterval
+from .base import LocationInferenceModel, TimeRange
+from .clustering import ClusteringModel
+
+METERS_PER_DEGREE = 6_371_000 * np.pi / 180
+
+# {pings}: the ping queryset's SQL, selecting (ping_id, utc_time, state_id, geom)
+CLUSTERS_SQL = """
+WITH pings (ping_id, utc_time, state_id, geom) AS ({pings}),
+-- equirectangular metres around the pings' mean latitude, which matches
+-- haversine distances at the scale of EPS_METERS
+origin AS (
+    SELECT cos(radians(avg(ST_Y(geom)))) AS x_scale FROM pings
+),
+clustered AS (
+    SELECT p.ping_id, p.utc_time, p.state_id,
+           -- noise points are clusters of their own
+           COALESCE(
+               ST_ClusterDBSCAN(
+                   ST_MakePoint(ST_X(p.geom) * o.x_scale * %s, ST_Y(p.geom) * %s),
+                   eps => %s, minpoints => %s
+               ) OVER (),
+               -row_number() OVER (ORDER BY p.ping_id)
+           ) AS cluster
+    FROM pings p CROSS JOIN origin o
+),
+modes AS (
+    SELECT DISTINCT ON (cluster) cluster, state_id, count(*) AS state_count
+    FROM clustered
+    WHERE state_id IS NOT NULL
+    GROUP BY cluster, state_id
+    ORDER BY cluster, count(*) DESC, state_id
+)
+SELECT (EXTRACT(EPOCH FROM min(c.utc_time)) * 1000000)::bigint,
+       (EXTRACT(EPOCH FROM max(c.utc_time)) * 1000000)::bigint,
+       count(*),
+       m.state_id,
+       COALESCE(m.state_count, 0)
+FROM clustered c LEFT JOIN modes m USING (cluster)
+GROUP BY c.cluster, m.state_id, m.state_count
+ORDER BY 1, 2
+"""
+
+
+class SqlClusteringModel(ClusteringModel):
+    """
+    Approach 2 with the clustering done by the database: PostGIS runs
+    DBSCAN (``ST_ClusterDBSCAN``) over the pings and aggregates every
+    cluster's time span and modal state, so only one row per cluster is
+    fetched.  Scoring and flip merging are those of ``ClusteringModel``.
+    """
+    method_id = LocationInterval.Method.SQL_CLUSTERING
+    name = "DBSCAN in PostGIS + smoothing"
+
+    def infer_intervals(self, subscriber: Subscriber, pings: List[SubscriberPing]):
+        try:
+            sql, params = (
+                pings.order_by().values_list("ping_id", "utc_time", "state_id", "geom")
+                .query.sql_with_params()
+            )
+        except EmptyResultSet:
+            return []
+        with connections[pings.db].cursor() as cursor:
+            cursor.execute(CLUSTERS_SQL.format(pings=sql), [
+                *params, METERS_PER_DEGREE, METERS_PER_DEGREE, self.EPS_METERS, self.MIN_SAMPLES,
+            ])
+            rows = cursor.fetchall()
+        if not rows:
+            return []
+
+        start, end, size, state_ids, state_count = zip(*rows)
+        states = np.array(sorted({pk for pk in state_ids if pk is not None}), dtype=object)
+        codes = {pk: code for code, pk in enumerate(states)}
+        summary = self.score_clusters(
+            np.array(start, dtype=np.int64),
+            np.array(end, dtype=np.int64),
+            np.array(size, dtype=np.int64),
+            np.array([codes.get(pk, -1) for pk in state_ids], dtype=np.int64),
+            np.array(state_count, dtype=np.int64),
+        )
+        return self.run_intervals(subscriber, self.merge_flips(summary), states)
+
+    def infer_many(self, subscriber_ids: Iterable[int],
+                   time_range: Optional[TimeRange] = None) -> Dict[int, List[LocationInterval]]:
+        # one clustering query per subscriber rather than loading every ping
+        return LocationInferenceModel.infer_many(self, subscriber_ids, time_range)
@@ -0,0 +1,108 @@
+from datetime import timedelta
+from typing import List, Optional
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from core.models import Subscriber, SubscriberPing, LocationInterval
+from .base import LocationInferenceModel
+from .majority_vote import MajorityVoteModel
+
+# {pings}: the ping queryset's SQL, selecting (ping_id, utc_time, state_id)
+INTERVALS_SQL = """
+WITH pings (ping_id, utc_time, state_id) AS ({pings}),
+states AS (
+    SELECT DISTINCT state_id AS code FROM pings WHERE state_id IS NOT NULL
+),
+-- pings of every state within the window around every ping
+counts AS (
+    SELECT p.ping_id, p.utc_time, s.code,
+           count(*) FILTER (WHERE p.state_id = s.code) OVER w AS votes,
+           count(*) OVER w AS total
+    FROM pings p LEFT JOIN states s ON TRUE
+    WINDOW w AS (PARTITION BY s.code ORDER BY p.utc_time
+                 RANGE BETWEEN %s::interval PRECEDING AND %s::interval FOLLOWING)
+),
+modes AS (
+    SELECT DISTINCT ON (ping_id) ping_id, utc_time,
+           CASE WHEN votes > 0 THEN code END AS vote,
+           votes::float / total AS confidence
+    FROM counts
+    ORDER BY ping_id, votes DESC, code
+),
+-- pings without a vote follow the previous vote (the first one at the start)
+gaps AS (
+    SELECT *,
+           count(vote) OVER (ORDER BY utc_time, ping_id) AS known,
+           first_value(vote) OVER (
+               ORDER BY vote IS NULL, utc_time, ping_id
+               ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+           ) AS first_vote
+    FROM modes
+),
+filled AS (
+    SELECT ping_id, utc_time, confidence,
+           COALESCE(first_value(vote) OVER (PARTITION BY known ORDER BY utc_time, ping_id),
+                    first_vote) AS vote
+    FROM gaps
+),
+-- gaps and islands: a new island starts wherever the vote changes
+changes AS (
+    SELECT *,
+           vote IS DISTINCT FROM lag(vote) OVER (ORDER BY utc_time, ping_id) AS changed
+    FROM filled
+),
+islands AS (
+    SELECT *, count(*) FILTER (WHERE changed) OVER (ORDER BY utc_time, ping_id) AS island
+    FROM changes
+)
+SELECT min(utc_time),
+       COALESCE(lead(min(utc_time)) OVER (ORDER BY island), max(utc_time)),
+       count(*),
+       min(vote),
+       round((avg(confidence) * 100)::numeric, 2)
+FROM islands
+GROUP BY island
+ORDER BY island
+"""
+
+
+class SqlMajorityVoteModel(LocationInferenceModel):
+    """
+    Approach 1 computed by the database: window counts per state, modes,
+    change points and confidence are SQL window functions, and only the
+    final intervals are fetched.
+    """
+    method_id = LocationInterval.Method.SQL_MAJORITY_VOTE
+    name = "Majority vote (SQL)"
+
+    WINDOW_SEC = MajorityVoteModel.WINDOW_SEC
+
+    def __init__(self, window_sec: Optional[int] = None):
+        if window_sec is not None:
+            self.WINDOW_SEC = window_sec
+
+    def infer_intervals(self, subscriber: Subscriber, pings: List[SubscriberPing]):
+        try:
+            sql, params = (
+                pings.order_by().values_list("ping_id", "utc_time", "state_id")
+                .query.sql_with_params()
+            )
+        except EmptyResultSet:
+            return []
+        half_window = timedelta(seconds=self.WINDOW_SEC / 2)
+        with connections[pings.db].cursor() as cursor:
+            cursor.execute(INTERVALS_SQL.format(pings=sql), [*params, half_window, half_window])
+            rows = cursor.fetchall()
+        return [
+            LocationInterval(
+                subscriber=subscriber,
+                interval_start=start,
+                interval_end=end,
+                ping_count=count,
+                state_id=state_id,
+                confidence_pct=confidence,
+                method=self.method_id,
+            )
+            for start, end, count, state_id, confidence in rows
+        ]
@@ -0,0 +1,157 @@
+"""
+Materialized timelines.
+
+Every algorithm's intervals are stored in ``LocationInterval`` and an
+``IntervalWatermark`` per method records the last ping folded in.  A
+recompute only looks at pings added since the watermark: subscribers without
+stored intervals are inferred in full (in batches through ``infer_many``),
+the others only over the stored intervals their new pings fall into.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+
+from core.models import IntervalWatermark, LocationInterval, Subscriber, SubscriberPing
+from .base import LocationInferenceModel
+
+
+@dataclass
+class RecomputeStats:
+    method: int
+    subscribers: int = 0
+    intervals: int = 0
+    last_ping_id: int = 0
+
+
+def _chunks(ids: Sequence[int], size: int) -> Iterator[Sequence[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def touched_ranges(after_ping_id: int, upto_ping_id: int) -> Dict[int, Tuple[datetime, datetime]]:
+    """
+    Returns the first and last ``utc_time`` of the pings with an id in
+    ``(after_ping_id, upto_ping_id]``, per subscriber.
+    """
+    rows = (
+        SubscriberPing.objects
+        .filter(ping_id__gt=after_ping_id, ping_id__lte=upto_ping_id, subscriber__isnull=False)
+        .values("subscriber_id")
+        .annotate(first=Min("utc_time"), last=Max("utc_time"))
+        .order_by()
+    )
+    return {row["subscriber_id"]: (row["first"], row["last"]) for row in rows}
+
+
+def recompute_intervals(method_id: int, full: bool = False, chunk_size: int = 500) -> RecomputeStats:
+    """
+    Brings the stored intervals of ``method_id`` up to date with the pings
+    added since its watermark (every ping with ``full``).
+    """
+    algorithm = LocationInferenceModel.get(method_id)
+    watermark, _ = IntervalWatermark.objects.get_or_create(method=method_id)
+    after = 0 if full else watermark.last_ping_id
+    upto = SubscriberPing.objects.aggregate(latest=Max("ping_id"))["latest"] or 0
+    stats = RecomputeStats(method=method_id, last_ping_id=max(after, upto))
+    if upto <= after:
+        return stats
+
+    touched = touched_ranges(after, upto)
+    stored = set()
+    if not full:
+        for chunk in _chunks(list(touched), chunk_size):
+            stored.update(
+                LocationInterval.objects
+                .filter(method=method_id, subscriber_id__in=chunk)
+                .values_list("subscriber_id", flat=True)
+                .distinct()
+            )
+
+    # no stored timeline yet: infer everything, many subscribers per query
+    fresh = [pk for pk in touched if pk not in stored]
+    for chunk in _chunks(fresh, chunk_size):
+        timelines = algorithm.infer_many(chunk)
+        with transaction.atomic():
+            LocationInterval.objects.filter(method=method_id, subscriber_id__in=chunk).delete()
+            created = LocationInterval.objects.bulk_create(
+                interval for intervals in timelines.values() for interval in intervals
+            )
+        stats.intervals += len(created)
+
+    for chunk in _chunks(sorted(stored), chunk_size):
+        subscribers = Subscriber.objects.in_bulk(chunk)
+        for pk, subscriber in subscribers.items():
+            stats.intervals += _replace_range(algorithm, subscriber, *touched[pk])
+
+    stats.subscribers = len(touched)
+    # pings committed later with a lower id than ``upto`` are only seen by a
+    # full recompute; ingestion commits in id order in practice.  A rewind
+    # made meanwhile (pings changed in place) is kept for the next run.
+    IntervalWatermark.objects.filter(
+        method=method_id, last_ping_id=watermark.last_ping_id
+    ).update(last_ping_id=upto, updated_at=timezone.now())
+    return stats
+
+
+def _replace_range(algorithm: LocationInferenceModel, subscriber: Subscriber,
+                   first: datetime, last: datetime) -> int:
+    """
+    Re-infers the stored intervals holding ``[first, last]``: from the start
+    of the interval ``first`` falls into up to the next interval starting
+    after ``last``.
+    """
+    intervals = LocationInterval.objects.filter(subscriber=subscriber, method=algorithm.method_id)
+    lo = (
+        intervals.filter(interval_start__lte=first)
+        .order_by("-interval_start").values_list("interval_start", flat=True).first()
+    ) or first
+    hi = (
+        intervals.filter(interval_start__gt=last)
+        .order_by("interval_start").values_list("interval_start", flat=True).first()
+    )
+    pings = algorithm.pings_in_range(subscriber.pings.all(), (lo, hi))
+    timeline = algorithm.infer_intervals(subscriber, pings=pings)
+    with transaction.atomic():
+        stale = intervals.filter(interval_start__gte=lo)
+        if hi is not None:
+            stale = stale.filter(interval_start__lt=hi)
+        stale.delete()
+        return len(LocationInterval.objects.bulk_create(timeline))
+
+
+def stored_timeline(subscriber: Subscriber, method_id: int, pings) -> Optional[List[LocationInterval]]:
+    """
+    Returns the stored intervals spanning ``pings`` when every one of them
+    has been folded in, ``None`` when they have to be inferred.  They are
+    the intervals of the whole timeline, neither clipped nor recounted, so
+    ``pings`` has to be every ping of the subscriber.
+    """
+    intervals = stored_intervals(subscriber, method_id, pings)
+    return None if intervals is None else list(intervals)
+
+
+def stored_intervals(subscriber: Subscriber, method_id: int, pings) -> Optional[QuerySet]:
+    """
+    Like ``stored_timeline``, as a queryset in time order.
+    """
+    watermark = (
+        IntervalWatermark.objects.filter(method=method_id)
+        .values_list("last_ping_id", flat=True).first()
+    )
+    if watermark is None:
+        return None
+    bounds = pings.aggregate(latest=Max("ping_id"), first=Min("utc_time"), last=Max("utc_time"))
+    if bounds["latest"] is None or bounds["latest"] > watermark:
+        return None
+    return (
+        subscriber.intervals
+        .filter(method=method_id, interval_end__gte=bounds["first"],
+                interval_start__lte=bounds["last"])
+        .order_by("interval_start")
+    )
@@ -0,0 +1,31 @@
+"""
+Entry points of the ``import_many`` worker processes.
+
+Spawned workers import this module to find their initializer before
+``django.setup()`` has run, so it must not import models, directly or
+through ``core.ingestion``; the ingestion code is imported once the worker
+is set up.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+import django
+from django.conf import settings
+from django.db import connections
+
+
+def init(database_names: Dict[str, str]) -> None:
+    # connect to the databases the parent uses (the test database in tests)
+    for alias, name in database_names.items():
+        settings.DATABASES[alias]["NAME"] = name
+    django.setup()
+
+
+def import_group(group: Tuple[str, List[str]], batch_size: int) -> list:
+    from core.ingestion.parallel import import_subscriber_files
+
+    try:
+        return import_subscriber_files(*group, batch_size=batch_size)
+    finally:
+        connections.close_all()
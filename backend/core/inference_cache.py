@@ -0,0 +1,106 @@
+"""
+Cache of ``/infer/`` responses.
+
+Entries live in the ``inference`` cache alias and are keyed by subscriber,
+model, query parameters and the subscriber's ``pings_version``: a counter
+stored on the subscriber row and bumped in the same transaction as every
+write to its pings.  Every process reads it from the database, so entries
+built from older pings are never read again, whichever process wrote the
+pings, and simply age out.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import asdict, dataclass
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from core.models import Subscriber
+
+CACHE_ALIAS = "inference"
+
+
+@dataclass
+class CacheMetrics:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+metrics = CacheMetrics()
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return settings.INFERENCE_CACHE["ENABLED"]
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def cache_key(subscriber: Subscriber, model_id: int, params) -> str:
+    """
+    Returns the entry key of one ``/infer/`` request; ``params`` are its
+    query parameters (a ``QueryDict`` or a plain mapping).  ``subscriber``
+    has to be read before its pings are.
+    """
+    items = params.lists() if hasattr(params, "lists") else params.items()
+    digest = hashlib.sha1(
+        json.dumps(sorted(items), default=str).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"infer:{subscriber.pk}:{model_id}:{subscriber.pings_version}:{digest}"
+
+
+def lookup(key: str) -> Optional[dict]:
+    data = _cache().get(key)
+    with _lock:
+        if data is None:
+            metrics.misses += 1
+        else:
+            metrics.hits += 1
+    return data
+
+
+def store(key: str, data: dict) -> None:
+    _cache().set(key, data)
+    with _lock:
+        metrics.stores += 1
+
+
+def invalidate(subscriber_ids: Optional[Iterable[int]] = None, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Bumps the ``pings_version`` of ``subscriber_ids`` (of everyone when
+    ``None``), which drops their cached inferences.  It is part of the
+    caller's transaction, so it becomes visible together with the pings.
+    """
+    subscribers = Subscriber.objects.using(using)
+    if subscriber_ids is not None:
+        subscriber_ids = {pk for pk in subscriber_ids if pk is not None}
+        if not subscriber_ids:
+            return
+        subscribers = subscribers.filter(pk__in=subscriber_ids)
+    bumped = subscribers.update(pings_version=F("pings_version") + 1)
+    with _lock:
+        metrics.invalidations += bumped
+
+
+def stats() -> dict:
+    with _lock:
+        stats = asdict(metrics)
+        stats["hit_rate"] = round(metrics.hit_rate, 4)
+    backend = _cache()
+    stats.update(enabled=enabled(), backend=f"{type(backend).__module__}.{type(backend).__name__}")
+    return stats
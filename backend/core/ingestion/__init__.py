@@ -0,0 +1,7 @@
+from .locator import StateLocator, get_state_locator, invalidate_state_locator
+from .loader import LoadStats, PingCopyLoader
+from .states import assign_states
+from .pipeline import CheckpointMismatch, import_columnar, import_csv, import_file
+from .upsert import delete_duplicate_pings, upsert_ping
+from .records import IngestSummary, ingest_records, iter_json_records, parse_ping_record
+from .ingest_queue import IngestQueue, QueueFull, get_ingest_queue, queue_row
@@ -0,0 +1,93 @@
+"""
+Readers for columnar carrier exports (Parquet and Arrow IPC).
+
+Record batches are converted to loader frames column by column: timestamps
+and coordinates are cast with Arrow/pandas kernels, never row by row, and
+invalid rows are dropped with a mask.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from .loader import COLUMNS
+from .sources import CSV_TIME_FORMAT, SOURCE_FIELDS, ErrorHandler
+
+PARQUET_SUFFIXES = frozenset({".parquet", ".pq"})
+ARROW_SUFFIXES = frozenset({".arrow", ".feather", ".ipc"})
+
+
+def is_columnar(path: str) -> bool:
+    return Path(path).suffix.lower() in PARQUET_SUFFIXES | ARROW_SUFFIXES
+
+
+def iter_record_batches(path: str, rows: int) -> Iterator[pa.RecordBatch]:
+    """
+    Yields record batches of at most ``rows`` rows; Parquet files are read
+    row group by row group, Arrow files are memory mapped.
+    """
+    if Path(path).suffix.lower() in PARQUET_SUFFIXES:
+        yield from pq.ParquetFile(path).iter_batches(batch_size=rows)
+        return
+
+    source = pa.memory_map(path)
+    try:
+        reader = ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        source.seek(0)
+        batches = iter(ipc.open_stream(source))
+    for batch in batches:
+        for offset in range(0, batch.num_rows, rows):
+            yield batch.slice(offset, rows)
+
+
+def _column(batch: pa.RecordBatch, name: str) -> pa.Array:
+    for source, target in SOURCE_FIELDS.items():
+        if name == target and source in batch.schema.names:
+            return batch.column(source)
+    return batch.column(name)
+
+
+def _timestamps(column: pa.Array) -> pd.Series:
+    if pa.types.is_timestamp(column.type):
+        times = pd.Series(column.to_pandas())
+        if column.type.tz is not None:
+            times = times.dt.tz_convert("UTC").dt.tz_localize(None)
+        return times
+    text = pd.Series(column.to_pandas(), dtype="string")
+    times = pd.to_datetime(text, format=CSV_TIME_FORMAT, errors="coerce")
+    missing = times.isna() & text.notna()
+    if missing.any():
+        iso = pd.to_datetime(text[missing], format="ISO8601", errors="coerce", utc=True)
+        times[missing] = iso.dt.tz_localize(None)
+    return times
+
+
+def batch_frame(batch: pa.RecordBatch, first_row: int,
+                on_error: Optional[ErrorHandler] = None) -> pd.DataFrame:
+    """
+    Returns the loader frame of one record batch.  Rows with a missing or
+    unparsable value are reported to ``on_error`` with their 1-based row
+    number in the file and dropped.
+    """
+    frame = pd.DataFrame({
+        "utc_time": _timestamps(_column(batch, "utc_time")),
+        "cell_type": pd.Series(_column(batch, "cell_type").to_pandas(), dtype="object"),
+        "longitude": pd.to_numeric(_column(batch, "longitude").to_pandas(), errors="coerce"),
+        "latitude": pd.to_numeric(_column(batch, "latitude").to_pandas(), errors="coerce"),
+    }, columns=list(COLUMNS))
+    invalid = frame.isna().any(axis=1).to_numpy()
+    if invalid.any():
+        if on_error is not None:
+            for position in np.flatnonzero(invalid):
+                row = frame.iloc[position].to_dict()
+                on_error(first_row + int(position), f"missing or invalid value in {row}")
+        frame = frame[~invalid]
+    return frame.reset_index(drop=True)
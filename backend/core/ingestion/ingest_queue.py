@@ -0,0 +1,257 @@
+"""
+In-process ingest queue for the REST write path.
+
+``POST /api/subscriber-pings/`` only validates and enqueues when the queue is
+enabled; writer threads drain it in batches (by size or age) through the COPY
+loader.  The queue is bounded, so a burst beyond ``MAX_SIZE`` pending pings is
+refused instead of growing memory.  Each server process owns its own queue.
+
+Pings are acknowledged before they are written, so a failed batch is never
+discarded: it is retried, then split in halves to isolate the rows the
+database rejects, and only those end up in the dead-letter buffer.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Callable, Deque, List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, connections
+
+from .loader import PingCopyLoader
+from .records import RECORD_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+QUEUE_COLUMNS = RECORD_COLUMNS + ("state_id",)
+
+
+class QueueFull(Exception):
+    """
+    The ingest queue is at capacity; the client should retry later.
+    """
+
+
+@dataclass
+class QueueMetrics:
+    enqueued: int = 0
+    rejected: int = 0
+    written: int = 0
+    inserted: int = 0
+    retries: int = 0
+    dead_lettered: int = 0
+    batches: int = 0
+    last_flush_ms: float = 0.0
+    max_flush_ms: float = 0.0
+    total_flush_ms: float = 0.0
+
+    @property
+    def avg_flush_ms(self) -> float:
+        return self.total_flush_ms / self.batches if self.batches else 0.0
+
+
+class IngestQueue:
+    """
+    Bounded buffer of ``QUEUE_COLUMNS`` tuples flushed by ``workers`` writer
+    threads.  With ``workers=0`` nothing is flushed in the background and
+    ``flush_once()`` has to be called explicitly.
+
+    A batch failing on a database error is retried ``retries`` times
+    (waiting ``retry_delay`` seconds, doubled each time); a batch the database
+    rejects for its data is split until the offending pings are alone.
+    Pings that still cannot be written are kept in ``dead_letters`` (the
+    latest ``max_size``) and logged.
+    """
+
+    def __init__(self, max_size: int = 50_000, batch_size: int = 5_000,
+                 flush_interval: float = 1.0, workers: int = 2,
+                 loader_factory: Callable[[], PingCopyLoader] = PingCopyLoader,
+                 retries: int = 3, retry_delay: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.workers = workers
+        self.loader_factory = loader_factory
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.metrics = QueueMetrics()
+        self.dead_letters: Deque[tuple] = deque(maxlen=max_size)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # --- producer side ---------------------------------------------------
+    def put(self, row: tuple) -> int:
+        """
+        Enqueues one ping without blocking and returns the queue depth.
+        """
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.metrics.rejected += 1
+            raise QueueFull(f"{self._queue.maxsize} pings already pending")
+        with self._lock:
+            self.metrics.enqueued += 1
+        return self._queue.qsize()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = asdict(self.metrics)
+            stats["avg_flush_ms"] = self.metrics.avg_flush_ms
+        stats.update(depth=self.depth, max_size=self._queue.maxsize,
+                     workers=len(self._threads), dead_letters=len(self.dead_letters))
+        return stats
+
+    # --- consumer side ---------------------------------------------------
+    def start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingest-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops the writers after they drained what is still queued.
+        """
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def flush_once(self, block: bool = False) -> int:
+        """
+        Writes up to ``batch_size`` queued pings and returns how many were
+        taken.  With ``block`` it waits up to ``flush_interval`` for the
+        batch to fill.
+        """
+        batch = self._take(block)
+        if batch:
+            self._write(batch)
+        return len(batch)
+
+    def _run(self) -> None:
+        try:
+            while not (self._stopping.is_set() and self._queue.empty()):
+                self.flush_once(block=True)
+                connections["default"].close_if_unusable_or_obsolete()
+        finally:
+            connections.close_all()
+
+    def _take(self, block: bool) -> List[tuple]:
+        batch: List[tuple] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[tuple]) -> None:
+        loader = self.loader_factory()
+        started = time.perf_counter()
+        try:
+            inserted = self._write_retrying(loader, batch)
+        except (DataError, IntegrityError):
+            if len(batch) == 1:
+                self._dead_letter(batch)
+            else:
+                half = len(batch) // 2
+                self._write(batch[:half])
+                self._write(batch[half:])
+            return
+        except Exception:
+            self._dead_letter(batch)
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            metrics = self.metrics
+            metrics.written += len(batch)
+            metrics.inserted += inserted
+            metrics.batches += 1
+            metrics.last_flush_ms = elapsed
+            metrics.max_flush_ms = max(metrics.max_flush_ms, elapsed)
+            metrics.total_flush_ms += elapsed
+
+    def _write_retrying(self, loader: PingCopyLoader, batch: List[tuple]) -> int:
+        # data errors fail the same way every time, so only the others are retried
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                return loader.write(None, loader.frame(batch, QUEUE_COLUMNS))
+            except (DataError, IntegrityError):
+                raise
+            except DatabaseError:
+                if attempt == self.retries:
+                    raise
+                logger.warning("Retrying a batch of %d queued pings", len(batch), exc_info=True)
+                with self._lock:
+                    self.metrics.retries += 1
+                connections[loader.using].close()
+                time.sleep(delay)
+                delay *= 2
+
+    def _dead_letter(self, batch: List[tuple]) -> None:
+        logger.exception("Could not write %d queued pings: %r", len(batch), batch[:10])
+        with self._lock:
+            self.dead_letters.extend(batch)
+            self.metrics.dead_lettered += len(batch)
+
+
+def queue_row(data: dict) -> tuple:
+    """
+    Returns the ``QUEUE_COLUMNS`` tuple of a ping serializer's
+    ``validated_data``.
+    """
+    subscriber = data.get("subscriber")
+    state = data.get("state")
+    geom = data["geom"]
+    return (
+        subscriber.pk if subscriber is not None else None,
+        data["utc_time"],
+        data["cell_type"],
+        geom.x,
+        geom.y,
+        state.pk if state is not None else data.get("state_id"),
+    )
+
+
+_queue: Optional[IngestQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_ingest_queue() -> IngestQueue:
+    """
+    Returns this process' queue, configured by ``settings.INGEST_QUEUE`` and
+    started on first use.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            config = settings.INGEST_QUEUE
+            _queue = IngestQueue(
+                max_size=config["MAX_SIZE"],
+                batch_size=config["BATCH_SIZE"],
+                flush_interval=config["FLUSH_INTERVAL"],
+                workers=config["WORKERS"],
+            )
+            _queue.start()
+            atexit.register(_queue.stop, config["FLUSH_INTERVAL"] * 2)
+        return _queue
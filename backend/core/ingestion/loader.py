@@ -0,0 +1,173 @@
+"""
+Bulk loading of subscriber pings through PostgreSQL ``COPY``.
+
+Rows are streamed into a session-local staging table and moved into
+``core_subscriberping`` with a single ``INSERT … SELECT`` per batch, so a
+batch costs two statements no matter how many pings it carries.  Rows that
+already exist under the ping natural key are skipped by ``ON CONFLICT``, which
+makes re-importing a feed idempotent.
+"""
+from __future__ import annotations
+
+import io
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+
+import pandas as pd
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core import inference_cache
+from core.models import SubscriberPing
+from .locator import StateLocator, get_state_locator
+
+
+STAGING_TABLE = "core_ping_staging"
+NATURAL_KEY = "core_ping_natural_key"
+
+# order of the columns read from the sources
+COLUMNS = ("utc_time", "cell_type", "longitude", "latitude")
+# order of the columns written to the staging table
+STAGING_COLUMNS = ("subscriber_id",) + COLUMNS + ("state_id",)
+
+
+@dataclass
+class LoadStats:
+    """
+    Running counters of one load (or of several merged together).
+    """
+    rows: int = 0
+    inserted: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    resumed_rows: int = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.rows - self.inserted
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def merge(self, other: "LoadStats") -> "LoadStats":
+        self.rows += other.rows
+        self.inserted += other.inserted
+        self.errors += other.errors
+        self.seconds += other.seconds
+        self.resumed_rows += other.resumed_rows
+        return self
+
+
+class PingCopyLoader:
+    """
+    Writes batches of pings with ``COPY FROM STDIN``.
+
+    ``write()`` takes a DataFrame with the columns in ``COLUMNS``, plus a
+    ``subscriber_id`` column when the batch mixes subscribers; states
+    are resolved in memory by the ``StateLocator`` unless the frame already
+    carries a ``state_id`` column, and the point geometry is built by PostGIS
+    inside the ``INSERT … SELECT``.
+    """
+
+    def __init__(self, batch_size: int = 50_000, using: str = DEFAULT_DB_ALIAS,
+                 locator: Optional[StateLocator] = None):
+        self.batch_size = batch_size
+        self.using = using
+        self.locator = locator
+
+    # --- public API ------------------------------------------------------
+    def load(self, subscriber_id: int, rows: Iterable[tuple]) -> LoadStats:
+        """
+        Consumes ``(utc_time, cell_type, longitude, latitude)`` tuples and
+        writes them in batches of ``batch_size``.
+        """
+        stats = LoadStats()
+        started = time.perf_counter()
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                stats.inserted += self.write(subscriber_id, self.frame(batch))
+                stats.rows += len(batch)
+                batch = []
+        if batch:
+            stats.inserted += self.write(subscriber_id, self.frame(batch))
+            stats.rows += len(batch)
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def write(self, subscriber_id: Optional[int], frame: pd.DataFrame) -> int:
+        """
+        Loads one batch atomically and returns the number of inserted pings,
+        which excludes duplicates of stored pings.  ``subscriber_id`` applies
+        to every row unless it is ``None`` and the frame carries its own.
+        """
+        if frame.empty:
+            return 0
+        if subscriber_id is not None:
+            frame = frame.assign(subscriber_id=subscriber_id)
+        # nullable integers: a missing subscriber would otherwise turn the
+        # column into floats, written as "12.0", which bigint rejects
+        frame = frame.astype({"subscriber_id": "Int64"})
+        if "state_id" not in frame:
+            locator = self.locator or get_state_locator()
+            frame = frame.assign(
+                state_id=locator.locate(frame["longitude"].values, frame["latitude"].values)
+            )
+        buffer = io.StringIO()
+        frame.loc[:, STAGING_COLUMNS].to_csv(
+            buffer, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S.%f"
+        )
+        buffer.seek(0)
+
+        connection = connections[self.using]
+        with transaction.atomic(using=self.using), connection.cursor() as cursor:
+            cursor.execute(self._staging_sql())
+            cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+            # raised as Django's DataError / IntegrityError like execute()'s
+            with connection.wrap_database_errors:
+                cursor.copy_expert(
+                    f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+            cursor.execute(self._insert_sql())
+            inserted = cursor.rowcount
+            if inserted:
+                subscriber_ids = (
+                    [subscriber_id] if subscriber_id is not None
+                    else [int(pk) for pk in frame["subscriber_id"].dropna().unique()]
+                )
+                inference_cache.invalidate(subscriber_ids, using=self.using)
+            return inserted
+
+    @staticmethod
+    def frame(batch: List[tuple], columns: Sequence[str] = COLUMNS) -> pd.DataFrame:
+        return pd.DataFrame.from_records(batch, columns=list(columns))
+
+    # --- helpers ---------------------------------------------------------
+    @staticmethod
+    def _staging_sql() -> str:
+        # session-local, so concurrent loaders never see each other's rows
+        return f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                subscriber_id bigint,
+                utc_time      timestamp        NOT NULL,
+                cell_type     varchar(6)       NOT NULL,
+                longitude     double precision NOT NULL,
+                latitude      double precision NOT NULL,
+                state_id      varchar(10)
+            )
+        """
+
+    @staticmethod
+    def _insert_sql() -> str:
+        return f"""
+            INSERT INTO {SubscriberPing._meta.db_table}
+                (subscriber_id, utc_time, cell_type, geom, state_id)
+            SELECT s.subscriber_id, s.utc_time, s.cell_type,
+                   ST_SetSRID(ST_MakePoint(s.longitude, s.latitude), 4326),
+                   s.state_id
+            FROM {STAGING_TABLE} s
+            ON CONFLICT ON CONSTRAINT {NATURAL_KEY} DO NOTHING
+        """
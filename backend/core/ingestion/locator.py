@@ -0,0 +1,157 @@
+"""
+In-memory point → state lookup.
+
+All ``State.geom`` rows are loaded once into Shapely, prepared, and indexed
+with an STR-tree, so locating a batch of pings is two vectorized calls
+(bounding-box query + prepared ``contains``) without any database round trip.
+The shared instance is rebuilt when a cheap fingerprint of the state rows
+changes, so boundaries edited by another process are picked up too.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import shapely
+from django.contrib.gis.db.models.functions import AsWKB
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.models import State
+
+# vertices per indexed border piece; short pieces keep nearest-border queries cheap
+BORDER_PIECE_VERTICES = 32
+
+
+class StateLocator:
+    """
+    Answers ``locate(lons, lats) -> state_codes`` for whole arrays of points.
+    Points outside every state (or on a border) map to ``None``, matching
+    ``ST_Contains``.
+    """
+
+    def __init__(self, states: Iterable[Tuple[str, bytes]]):
+        codes, wkbs = [], []
+        for code, wkb in states:
+            codes.append(code)
+            wkbs.append(bytes(wkb))
+        self.codes = np.array(codes, dtype=object)
+        self.geoms = shapely.from_wkb(wkbs) if wkbs else np.empty(0, dtype=object)
+        shapely.prepare(self.geoms)
+        self.tree = shapely.STRtree(self.geoms)
+        self._border_tree: Optional[shapely.STRtree] = None
+        self._border_lock = threading.Lock()
+
+    @classmethod
+    def from_db(cls, using: str = DEFAULT_DB_ALIAS) -> "StateLocator":
+        rows = (
+            State.objects.using(using)
+            .annotate(wkb=AsWKB("geom"))
+            .values_list("state_code", "wkb")
+            .order_by("state_code")
+        )
+        return cls(rows)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def locate(self, lons, lats) -> np.ndarray:
+        """
+        Returns an object array with the state code of every point.
+        """
+        points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        result = np.full(len(points), None, dtype=object)
+        if not len(self.codes) or not len(points):
+            return result
+
+        point_idx, state_idx = self.tree.query(points)
+        hits = shapely.contains(self.geoms[state_idx], points[point_idx])
+        result[point_idx[hits]] = self.codes[state_idx[hits]]
+        return result
+
+    def locate_one(self, lon: float, lat: float) -> Optional[str]:
+        return self.locate([lon], [lat])[0]
+
+    def border_distance(self, lons, lats) -> np.ndarray:
+        """
+        Returns the planar distance, in degrees, from every point to the
+        nearest state border (``inf`` when there are no states).
+        """
+        points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        result = np.full(len(points), np.inf)
+        tree = self._borders()
+        if tree is None or not len(points):
+            return result
+        (point_idx, _), distances = tree.query_nearest(
+            points, return_distance=True, all_matches=False
+        )
+        result[point_idx] = distances
+        return result
+
+    def _borders(self) -> Optional[shapely.STRtree]:
+        # built on first use: only the HMM model needs the borders
+        with self._border_lock:
+            if self._border_tree is None and len(self.geoms):
+                pieces = []
+                for line in shapely.get_parts(shapely.boundary(self.geoms)):
+                    coords = shapely.get_coordinates(line)
+                    for i in range(0, len(coords) - 1, BORDER_PIECE_VERTICES):
+                        pieces.append(shapely.LineString(coords[i:i + BORDER_PIECE_VERTICES + 1]))
+                self._border_tree = shapely.STRtree(pieces)
+            return self._border_tree
+
+
+# --- process-wide instance ------------------------------------------------
+# how long, in seconds, the shared locator is used before it is compared with
+# the states in the database again
+CHECK_INTERVAL = 5.0
+
+_locator: Optional[StateLocator] = None
+_stamp: Optional[tuple] = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def state_stamp(using: str = DEFAULT_DB_ALIAS) -> tuple:
+    """
+    Fingerprint of the stored states.  Every insert or update writes a row
+    version with a new ``xmin`` and a delete changes the count, so it moves
+    with any change made by any process, without reading a geometry.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT count(*), coalesce(sum(xmin::text::bigint), 0) FROM {State._meta.db_table}"
+        )
+        return cursor.fetchone()
+
+
+def get_state_locator() -> StateLocator:
+    """
+    Returns the shared locator, building it on first use and rebuilding it
+    when the states changed, in this process or another one (checked at
+    most every ``CHECK_INTERVAL`` seconds).
+    """
+    global _locator, _stamp, _checked
+    locator = _locator
+    if locator is not None and time.monotonic() - _checked < CHECK_INTERVAL:
+        return locator
+    with _lock:
+        if _locator is None or time.monotonic() - _checked >= CHECK_INTERVAL:
+            # read before the states, so a change in between rebuilds again
+            stamp = state_stamp()
+            if _locator is None or stamp != _stamp:
+                _locator = StateLocator.from_db()
+                _stamp = stamp
+            _checked = time.monotonic()
+        return _locator
+
+
+def invalidate_state_locator(**kwargs) -> None:
+    """
+    Drops the shared locator; doubles as a ``post_save``/``post_delete``
+    receiver for ``State``.
+    """
+    global _locator
+    with _lock:
+        _locator = None
@@ -0,0 +1,112 @@
+"""
+Fan-out of many ``(subscriber, file)`` imports over a process pool.
+
+Workers are spawned fresh and run ``django.setup()`` themselves (see
+``core.import_workers``), so each one opens its own database connection
+instead of sharing the parent's socket.
+All the files of one subscriber go to the same worker, one after the other,
+so two workers never race to create the same subscriber.
+"""
+from __future__ import annotations
+
+import csv
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.db import connections
+
+from core import import_workers
+
+from .columnar import is_columnar
+from .loader import LoadStats
+from .pipeline import import_file
+
+
+Task = Tuple[str, str]
+
+
+@dataclass
+class FileResult:
+    subscriber_name: str
+    path: str
+    stats: Optional[LoadStats] = None
+    error: Optional[str] = None
+
+    @property
+    def skipped(self) -> bool:
+        return self.stats is None and self.error is None
+
+
+def read_tasks(source: str) -> List[Task]:
+    """
+    Builds the task list from a directory of ``<subscriber>.csv`` (or
+    ``.parquet`` / ``.arrow``) files or
+    from a manifest CSV with ``subscriber`` and ``path`` columns (relative
+    paths are resolved against the manifest's directory).
+    """
+    source_path = Path(source)
+    if source_path.is_dir():
+        return [
+            (p.stem, str(p)) for p in sorted(source_path.iterdir())
+            if p.suffix.lower() == ".csv" or is_columnar(str(p))
+        ]
+
+    with open(source_path, newline="", encoding="utf-8") as f:
+        return [
+            (row["subscriber"], str(source_path.parent / row["path"]))
+            for row in csv.DictReader(f)
+        ]
+
+
+def group_tasks(tasks: List[Task]) -> List[Tuple[str, List[str]]]:
+    """
+    Returns the paths of every subscriber, in task order.
+    """
+    groups: Dict[str, List[str]] = {}
+    for subscriber_name, path in tasks:
+        groups.setdefault(subscriber_name, []).append(path)
+    return list(groups.items())
+
+
+def import_subscriber_files(subscriber_name: str, paths: List[str],
+                            batch_size: int = 50_000) -> List[FileResult]:
+    """
+    Imports the files of one subscriber in order; a failing file is reported
+    and the next one still imported.
+    """
+    results = []
+    for path in paths:
+        try:
+            stats = import_file(subscriber_name, path, batch_size=batch_size)
+            results.append(FileResult(subscriber_name, path, stats=stats))
+        except Exception:
+            results.append(FileResult(subscriber_name, path, error=traceback.format_exc(limit=3)))
+    return results
+
+
+def import_files(tasks: List[Task], workers: int, batch_size: int = 50_000) -> Iterator[FileResult]:
+    """
+    Runs every task on a pool of ``workers`` processes, one subscriber per
+    worker at a time, and yields results as subscribers complete.  A failing
+    file is reported, never raised.
+    """
+    database_names = {alias: connections[alias].settings_dict["NAME"] for alias in connections}
+    # never hand an open connection to the children
+    connections.close_all()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=import_workers.init,
+                             initargs=(database_names,)) as pool:
+        futures = {pool.submit(import_workers.import_group, group, batch_size): group
+                   for group in group_tasks(tasks)}
+        for future in as_completed(futures):
+            try:
+                yield from future.result()
+            except Exception as e:  # worker process died
+                subscriber_name, paths = futures[future]
+                for path in paths:
+                    yield FileResult(subscriber_name, path, error=repr(e))
@@ -0,0 +1,166 @@
+"""
+End-to-end import of one carrier file for one subscriber.
+
+The file is streamed chunk by chunk; each chunk's pings and the updated
+``ImportCheckpoint`` are committed in the same transaction, so a rerun after
+a crash continues exactly where the last commit left off.
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Optional
+
+from django.db import connection, transaction
+
+from core.models import ImportCheckpoint, Subscriber
+from .columnar import batch_frame, is_columnar, iter_record_batches
+from .loader import LoadStats, PingCopyLoader
+from .sources import (
+    ErrorHandler,
+    file_fingerprint,
+    iter_chunks,
+    parse_chunk,
+    range_sha256,
+    read_header,
+)
+
+
+class CheckpointMismatch(Exception):
+    """
+    The file no longer matches the chunk recorded by its checkpoint.
+    """
+
+
+def _checkpoint(subscriber_name: str, path: str) -> ImportCheckpoint:
+    """
+    Returns the checkpoint of ``path`` for the named subscriber, creating
+    both when this file was never imported for them.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # names are not unique: serialize imports creating the same one
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", [subscriber_name])
+        subscriber = Subscriber.objects.filter(name=subscriber_name).order_by("id").first()
+        if subscriber is None:
+            subscriber = Subscriber.objects.create(name=subscriber_name)
+
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+        subscriber=subscriber,
+        fingerprint=file_fingerprint(path),
+        defaults={"source": os.path.abspath(path)},
+    )
+    return checkpoint
+
+
+def _error_counter(on_error: Optional[ErrorHandler]):
+    errors = 0
+
+    def count_error(line_num: int, message: str) -> None:
+        nonlocal errors
+        errors += 1
+        if on_error is not None:
+            on_error(line_num, message)
+
+    return count_error, lambda: errors
+
+
+def import_file(
+    subscriber_name: str,
+    path: str,
+    batch_size: int = 50_000,
+    on_error: Optional[ErrorHandler] = None,
+) -> Optional[LoadStats]:
+    """
+    Imports a CSV, Parquet or Arrow file, picked by its extension.
+    """
+    importer = import_columnar if is_columnar(path) else import_csv
+    return importer(subscriber_name, path, batch_size=batch_size, on_error=on_error)
+
+
+def import_csv(
+    subscriber_name: str,
+    path: str,
+    batch_size: int = 50_000,
+    on_error: Optional[ErrorHandler] = None,
+) -> Optional[LoadStats]:
+    """
+    Imports (or resumes importing) ``path`` for the named subscriber and
+    returns the counters of this run, or ``None`` when there is nothing left
+    to import.  Rows appended to an imported file are picked up by the next
+    run.
+    """
+    checkpoint = _checkpoint(subscriber_name, path)
+    fieldnames, data_start = read_header(path)
+    start = max(checkpoint.byte_offset, data_start)
+    if checkpoint.completed and os.path.getsize(path) == start:
+        return None
+
+    if checkpoint.byte_offset:
+        if range_sha256(path, checkpoint.chunk_offset, checkpoint.byte_offset) != checkpoint.chunk_hash:
+            raise CheckpointMismatch(
+                f"{path} changed since row {checkpoint.rows_done} was committed"
+            )
+
+    count_error, error_count = _error_counter(on_error)
+    loader = PingCopyLoader(batch_size=batch_size)
+    stats = LoadStats(resumed_rows=checkpoint.rows_done)
+    started = time.perf_counter()
+    # line 1 is the header
+    first_line = checkpoint.rows_done + 2
+    checkpoint.completed = False
+    for chunk in iter_chunks(path, start, first_line, batch_size):
+        frame = parse_chunk(chunk, fieldnames, on_error=count_error)
+        with transaction.atomic():
+            stats.inserted += loader.write(checkpoint.subscriber_id, frame)
+            checkpoint.byte_offset = chunk.end
+            checkpoint.chunk_offset = chunk.start
+            checkpoint.chunk_hash = chunk.sha256
+            checkpoint.rows_done += len(chunk)
+            checkpoint.save()
+        stats.rows += len(frame)
+
+    checkpoint.completed = True
+    checkpoint.save(update_fields=["completed", "updated_at"])
+    stats.errors = error_count()
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def import_columnar(
+    subscriber_name: str,
+    path: str,
+    batch_size: int = 50_000,
+    on_error: Optional[ErrorHandler] = None,
+) -> Optional[LoadStats]:
+    """
+    Imports a Parquet or Arrow file in record batches.  Columnar files are
+    rewritten rather than appended to, so the checkpoint only records how
+    many rows were committed and a rerun skips past them.
+    """
+    checkpoint = _checkpoint(subscriber_name, path)
+    if checkpoint.completed:
+        return None
+
+    count_error, error_count = _error_counter(on_error)
+    loader = PingCopyLoader(batch_size=batch_size)
+    stats = LoadStats(resumed_rows=checkpoint.rows_done)
+    started = time.perf_counter()
+    position = 0
+    for batch in iter_record_batches(path, batch_size):
+        skip = min(max(checkpoint.rows_done - position, 0), batch.num_rows)
+        position += batch.num_rows
+        if skip == batch.num_rows:
+            continue
+        batch = batch.slice(skip)
+        frame = batch_frame(batch, position - batch.num_rows + 1, on_error=count_error)
+        with transaction.atomic():
+            stats.inserted += loader.write(checkpoint.subscriber_id, frame)
+            checkpoint.rows_done += batch.num_rows
+            checkpoint.save()
+        stats.rows += len(frame)
+
+    checkpoint.completed = True
+    checkpoint.save(update_fields=["completed", "updated_at"])
+    stats.errors = error_count()
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,156 @@
+"""
+Lightweight validation of JSON ping records for the bulk ingest endpoint.
+
+Records look like::
+
+    {"subscriber": 12, "utc_time": "2024-11-26T00:00:00Z",
+     "cell_type": "voice", "longitude": -74.0, "latitude": 40.7}
+
+Validation is a handful of type checks per record instead of a
+``ModelSerializer`` pass, and valid rows are loaded in chunks through the
+COPY loader.
+"""
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from core.models import Subscriber, SubscriberPing
+from .loader import PingCopyLoader
+
+
+RECORD_COLUMNS = ("subscriber_id", "utc_time", "cell_type", "longitude", "latitude")
+
+CELL_TYPES = frozenset(SubscriberPing.CellType.values)
+
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_ping_record(record) -> tuple:
+    """
+    Returns the ``RECORD_COLUMNS`` tuple of one record or raises
+    ``ValueError`` describing the first problem found.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+    try:
+        subscriber_id = record["subscriber"]
+        utc_time = record["utc_time"]
+        cell_type = record["cell_type"]
+        longitude = float(record["longitude"])
+        latitude = float(record["latitude"])
+    except KeyError as e:
+        raise ValueError(f"missing field {e.args[0]!r}")
+    except (TypeError, ValueError):
+        raise ValueError("longitude and latitude must be numbers")
+
+    if not isinstance(subscriber_id, int) or isinstance(subscriber_id, bool):
+        raise ValueError("subscriber must be an integer id")
+    if cell_type not in CELL_TYPES:
+        raise ValueError(f"cell_type must be one of {sorted(CELL_TYPES)}")
+    if not (math.isfinite(longitude) and -180 <= longitude <= 180
+            and math.isfinite(latitude) and -90 <= latitude <= 90):
+        raise ValueError("coordinates out of range")
+    if not isinstance(utc_time, str):
+        raise ValueError("utc_time must be an ISO 8601 string")
+    parsed = datetime.fromisoformat(utc_time)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return subscriber_id, parsed, cell_type, longitude, latitude
+
+
+def iter_json_records(stream: Optional[IO[bytes]], content_type: str) -> Iterator[Tuple[int, object]]:
+    """
+    Yields ``(position, record)`` pairs; ``position`` is the 1-based line of
+    an NDJSON body or the 1-based index inside a JSON array.  Lines that are
+    not valid JSON yield the ``ValueError`` instead of a record.
+    """
+    if stream is None:
+        return
+    if content_type == "application/json":
+        # a JSON array has to be parsed as a whole
+        try:
+            records = json.load(stream)
+        except ValueError as e:
+            yield 1, e
+            return
+        if not isinstance(records, list):
+            yield 1, ValueError("body must be a JSON array")
+            return
+        yield from enumerate(records, start=1)
+        return
+
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except ValueError as e:
+            yield line_num, e
+
+
+@dataclass
+class IngestSummary:
+    accepted: int = 0
+    inserted: int = 0
+    rejected: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    def reject(self, position: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": position, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "inserted": self.inserted,
+            "duplicates": self.accepted - self.inserted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def ingest_records(records: Iterable[Tuple[int, object]], chunk_size: int = 5_000,
+                   loader: Optional[PingCopyLoader] = None) -> IngestSummary:
+    """
+    Validates ``(position, record)`` pairs and loads the valid ones in
+    chunks of ``chunk_size``, one COPY + INSERT per chunk.
+    """
+    loader = loader or PingCopyLoader()
+    summary = IngestSummary()
+    chunk: List[Tuple[int, tuple]] = []
+
+    def flush():
+        known = set(
+            Subscriber.objects.filter(id__in={row[0] for _, row in chunk})
+            .values_list("id", flat=True)
+        )
+        rows = []
+        for position, row in chunk:
+            if row[0] in known:
+                rows.append(row)
+            else:
+                summary.reject(position, f"unknown subscriber {row[0]}")
+        if rows:
+            summary.inserted += loader.write(None, loader.frame(rows, RECORD_COLUMNS))
+            summary.accepted += len(rows)
+        chunk.clear()
+
+    for position, record in records:
+        if isinstance(record, Exception):
+            summary.reject(position, f"invalid JSON: {record}")
+            continue
+        try:
+            chunk.append((position, parse_ping_record(record)))
+        except ValueError as e:
+            summary.reject(position, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return summary
@@ -0,0 +1,152 @@
+"""
+Readers turning carrier CSV exports into frames for the loaders.
+
+CSV files are consumed in chunks of whole lines read from a binary handle,
+so every chunk knows the byte range it came from and an import can be
+resumed from the end of the last committed chunk.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+CSV_TIME_FORMAT = "%m/%d/%y %H:%M"
+
+# carrier column names to loader columns
+SOURCE_FIELDS = {
+    "UTCDateTime": "utc_time",
+    "CellType": "cell_type",
+    "Longitude": "longitude",
+    "Latitude": "latitude",
+}
+
+ErrorHandler = Callable[[int, str], None]
+
+FINGERPRINT_BYTES = 64 * 1024
+
+
+@dataclass
+class Chunk:
+    """
+    A run of complete CSV lines and the byte range ``[start, end)`` they
+    occupy in the file.
+    """
+    start: int
+    end: int
+    first_line: int
+    lines: List[bytes]
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @property
+    def sha256(self) -> str:
+        return hashlib.sha256(b"".join(self.lines)).hexdigest()
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    Identifies a file by the hash of its first block, which stays stable
+    while the file is being appended to; the CSV importer verifies the last
+    committed chunk before continuing past it.
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(FINGERPRINT_BYTES)).hexdigest()
+
+
+def range_sha256(path: str, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def read_header(path: str) -> Tuple[List[str], int]:
+    """
+    Returns the column names and the byte offset of the first data row.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        return next(csv.reader([header.decode("utf-8-sig")])), f.tell()
+
+
+def iter_chunks(path: str, start: int, first_line: int, rows: int) -> Iterator[Chunk]:
+    """
+    Yields chunks of at most ``rows`` lines starting at byte ``start``.
+    Only one chunk is held in memory at a time.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        while True:
+            lines = []
+            for _ in range(rows):
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line)
+            if not lines:
+                return
+            end = f.tell()
+            yield Chunk(start, end, first_line, lines)
+            start, first_line = end, first_line + len(lines)
+
+
+def parse_chunk(chunk: Chunk, fieldnames: List[str],
+                on_error: Optional[ErrorHandler] = None) -> pd.DataFrame:
+    """
+    Returns the loader frame (``utc_time``, ``cell_type``, ``longitude``,
+    ``latitude``) of every valid row of the chunk.  Lines are only split
+    here; times and coordinates are converted a whole column at a time.
+    Rows that fail to decode or parse are reported to ``on_error`` with
+    their line number and skipped; blank lines are ignored.
+    """
+    def report(line_num: int, message: str) -> None:
+        if on_error is not None:
+            on_error(line_num, message)
+
+    try:
+        indices = [fieldnames.index(name) for name in SOURCE_FIELDS]
+    except ValueError as e:
+        for line_num in range(chunk.first_line, chunk.first_line + len(chunk)):
+            report(line_num, f"{e!r} in header {fieldnames}")
+        return pd.DataFrame(columns=list(SOURCE_FIELDS.values()))
+
+    width = max(indices) + 1
+    line_nums, rows = [], []
+    text = []
+    for line_num, line in enumerate(chunk.lines, start=chunk.first_line):
+        try:
+            text.append(line.decode("utf-8"))
+        except UnicodeDecodeError as e:
+            report(line_num, f"{e!r}")
+            # an empty row keeps the following line numbers in step
+            text.append("")
+    reader = csv.reader(text)
+    for line_num, row in enumerate(reader, start=chunk.first_line):
+        if not row:
+            continue
+        if len(row) < width:
+            report(line_num, f"missing columns in {row}")
+            continue
+        line_nums.append(line_num)
+        rows.append([row[i] for i in indices])
+
+    raw = pd.DataFrame(rows, columns=list(SOURCE_FIELDS.values()), dtype=object)
+    # feeds are minute resolution, so the cache collapses most of the parsing
+    frame = pd.DataFrame({
+        "utc_time": pd.to_datetime(raw["utc_time"], format=CSV_TIME_FORMAT,
+                                   errors="coerce", cache=True),
+        "cell_type": raw["cell_type"],
+        "longitude": pd.to_numeric(raw["longitude"], errors="coerce"),
+        "latitude": pd.to_numeric(raw["latitude"], errors="coerce"),
+    })
+    invalid = frame.isna().any(axis=1).to_numpy()
+    if invalid.any():
+        for position in np.flatnonzero(invalid):
+            report(line_nums[position], f"invalid value in {rows[position]}")
+        frame = frame[~invalid].reset_index(drop=True)
+    return frame
@@ -0,0 +1,107 @@
+"""
+Set-based resolution of ``SubscriberPing.state`` inside PostGIS.
+
+Instead of one ``ST_Contains`` lookup per ping, the pings of a ``ping_id``
+range are joined against ``core_state`` in a single ``UPDATE … FROM``, which
+lets the planner drive the join from the GiST indexes on both geometries.
+Chunking by primary key keeps every statement short, so row locks are only
+held for one chunk at a time.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core import inference_cache
+from core.models import IntervalWatermark, State, SubscriberPing
+
+
+PINGS = SubscriberPing._meta.db_table
+STATES = State._meta.db_table
+
+
+def _filters(subscriber_ids, start, end) -> Tuple[List[str], list]:
+    clauses, params = [], []
+    if subscriber_ids is not None:
+        clauses.append("p.subscriber_id = ANY(%s)")
+        params.append(list(subscriber_ids))
+    if start is not None:
+        clauses.append("p.utc_time >= %s")
+        params.append(start)
+    if end is not None:
+        clauses.append("p.utc_time < %s")
+        params.append(end)
+    return clauses, params
+
+
+def assign_states(
+    subscriber_ids: Optional[Iterable[int]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    reset_states: Optional[Iterable[str]] = None,
+    chunk_size: int = 100_000,
+    using: str = DEFAULT_DB_ALIAS,
+) -> int:
+    """
+    Fills ``state_id`` of every unassigned ping matching the filters and
+    returns the number of pings that received a state.
+
+    ``reset_states`` re-resolves pings currently assigned to those state
+    codes, which is what is needed after their boundaries changed.
+    """
+    if subscriber_ids is not None:
+        subscriber_ids = list(subscriber_ids)
+    clauses, params = _filters(subscriber_ids, start, end)
+    where = " AND ".join(clauses) or "TRUE"
+    reset = list(reset_states or [])
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(ping_id), max(ping_id) FROM {PINGS} p WHERE {where}", params)
+        low, high = cursor.fetchone()
+    if low is None:
+        return 0
+
+    assigned = 0
+    for chunk_start in range(low, high + 1, chunk_size):
+        bounds = [chunk_start, chunk_start + chunk_size]
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            rows = []
+            if reset:
+                cursor.execute(
+                    f"""
+                    WITH changed AS (
+                        UPDATE {PINGS} p SET state_id = NULL
+                        WHERE p.ping_id >= %s AND p.ping_id < %s
+                          AND p.state_id = ANY(%s) AND {where}
+                        RETURNING p.subscriber_id, p.ping_id
+                    )
+                    SELECT subscriber_id, count(*), min(ping_id) FROM changed GROUP BY subscriber_id
+                    """,
+                    bounds + [reset] + params,
+                )
+                rows = cursor.fetchall()
+            cursor.execute(
+                f"""
+                WITH changed AS (
+                    UPDATE {PINGS} p SET state_id = s.state_code
+                    FROM {STATES} s
+                    WHERE p.ping_id >= %s AND p.ping_id < %s
+                      AND p.state_id IS NULL AND {where}
+                      AND ST_Contains(s.geom, p.geom)
+                    RETURNING p.subscriber_id, p.ping_id
+                )
+                SELECT subscriber_id, count(*), min(ping_id) FROM changed GROUP BY subscriber_id
+                """,
+                bounds + params,
+            )
+            assigned_rows = cursor.fetchall()
+            assigned += sum(count for _, count, _ in assigned_rows)
+            rows += assigned_rows
+            if rows:
+                # only the subscribers whose pings changed, with this chunk
+                inference_cache.invalidate([pk for pk, _, _ in rows], using=using)
+                IntervalWatermark.rewind(min(first for _, _, first in rows), using=using)
+    return assigned
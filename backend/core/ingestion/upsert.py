@@ -0,0 +1,126 @@
+"""
+Idempotent writes keyed on the ping natural key
+``(subscriber, utc_time, cell_type, geom)``.
+"""
+from __future__ import annotations
+
+from typing import Iterator, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core import inference_cache
+from core.models import IntervalWatermark, Subscriber, SubscriberPing
+from .loader import NATURAL_KEY
+
+
+PINGS = SubscriberPing._meta.db_table
+
+
+def upsert_ping(data: dict, using: str = DEFAULT_DB_ALIAS) -> Tuple[int, bool]:
+    """
+    Inserts one ping with ``ON CONFLICT DO NOTHING`` and returns its
+    ``ping_id`` and whether it was created.  ``data`` is a serializer's
+    ``validated_data``; replaying the same ping returns the stored row.
+    """
+    subscriber = data.get("subscriber")
+    state = data.get("state")
+    geom = data["geom"]
+    if geom.srid is None:
+        geom.srid = 4326
+    key = [
+        subscriber.pk if subscriber is not None else None,
+        data["utc_time"],
+        data["cell_type"],
+        bytes(geom.ewkb),
+    ]
+    state_id = state.pk if state is not None else data.get("state_id")
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {PINGS} (subscriber_id, utc_time, cell_type, geom, state_id)
+            VALUES (%s, %s, %s, ST_GeomFromEWKB(%s), %s)
+            ON CONFLICT ON CONSTRAINT {NATURAL_KEY} DO NOTHING
+            RETURNING ping_id
+            """,
+            key + [state_id],
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            inference_cache.invalidate([key[0]], using=using)
+            return row[0], True
+        cursor.execute(
+            f"""
+            SELECT ping_id FROM {PINGS}
+            WHERE subscriber_id IS NOT DISTINCT FROM %s AND utc_time = %s
+              AND cell_type = %s AND geom = ST_GeomFromEWKB(%s)
+            """,
+            key,
+        )
+        return cursor.fetchone()[0], False
+
+
+def _subscriber_chunks(chunk_size: int, using: str) -> Iterator[Tuple[int, int]]:
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"SELECT min(id), max(id) FROM {Subscriber._meta.db_table}")
+        low, high = cursor.fetchone()
+    if low is None:
+        return
+    for start in range(low, high + 1, chunk_size):
+        yield start, start + chunk_size
+
+
+def delete_duplicate_pings(
+    chunk_size: int = 100,
+    dry_run: bool = False,
+    using: str = DEFAULT_DB_ALIAS,
+) -> int:
+    """
+    Removes every ping sharing its natural key with an older one (lower
+    ``ping_id``) and returns how many were (or, with ``dry_run``, would be)
+    deleted.  Work is split in ranges of ``chunk_size`` subscribers, each in
+    its own short transaction, so no lock is held on the whole table; pings
+    without a subscriber share one key space and are handled last, together.
+    """
+    duplicates = f"""
+        SELECT ping_id, subscriber_id, original FROM (
+            SELECT ping_id, subscriber_id,
+                   row_number() OVER copies AS copy, min(ping_id) OVER copies AS original
+            FROM {PINGS}
+            WHERE {{scope}}
+            WINDOW copies AS (PARTITION BY subscriber_id, utc_time, cell_type, geom ORDER BY ping_id)
+        ) ranked
+        WHERE copy > 1
+    """
+    removed = 0
+    connection = connections[using]
+    scopes = [("subscriber_id >= %s AND subscriber_id < %s", list(bounds))
+              for bounds in _subscriber_chunks(chunk_size, using)]
+    scopes.append(("subscriber_id IS NULL", []))
+    for scope, params in scopes:
+        scoped = duplicates.format(scope=scope)
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            if dry_run:
+                cursor.execute(f"SELECT count(*) FROM ({scoped}) d", params)
+                removed += cursor.fetchone()[0]
+                continue
+            cursor.execute(
+                f"""
+                WITH duplicates AS ({scoped}),
+                deleted AS (
+                    DELETE FROM {PINGS} WHERE ping_id IN (SELECT ping_id FROM duplicates)
+                    RETURNING ping_id
+                )
+                SELECT d.subscriber_id, count(*), min(d.original)
+                FROM duplicates d JOIN deleted USING (ping_id)
+                GROUP BY d.subscriber_id
+                """,
+                params,
+            )
+            deleted = cursor.fetchall()
+            if deleted:
+                removed += sum(count for _, count, _ in deleted)
+                inference_cache.invalidate([pk for pk, _, _ in deleted], using=using)
+                # the kept copies' intervals counted the removed pings
+                IntervalWatermark.rewind(min(original for _, _, original in deleted), using=using)
+    return removed
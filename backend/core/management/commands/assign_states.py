@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from core.ingestion import assign_states
+
+
+class Command(BaseCommand):
+    help = 'Resolve the state of unassigned pings with a chunked spatial join'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriber', type=int, action='append', dest='subscribers',
+                            help='Restrict to this subscriber id (repeatable)')
+        parser.add_argument('--start', type=str, help='Only pings at or after this ISO datetime')
+        parser.add_argument('--end', type=str, help='Only pings before this ISO datetime')
+        parser.add_argument('--reset-state', action='append', dest='reset_states', default=[],
+                            help='Re-resolve pings currently assigned to this state code (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=100_000,
+                            help='Number of ping ids updated per statement')
+
+    def handle(self, *args, **options):
+        bounds = {}
+        for name in ('start', 'end'):
+            if options[name]:
+                bounds[name] = parse_datetime(options[name])
+                if bounds[name] is None:
+                    raise CommandError(f'Invalid --{name} datetime: {options[name]}')
+
+        assigned = assign_states(
+            subscriber_ids=options['subscribers'],
+            reset_states=options['reset_states'],
+            chunk_size=options['chunk_size'],
+            **bounds,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Assigned a state to {assigned} pings.'))
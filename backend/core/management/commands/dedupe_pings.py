@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.ingestion.upsert import delete_duplicate_pings
+
+
+class Command(BaseCommand):
+    help = 'Delete pings duplicating (subscriber, utc_time, cell_type, geom), keeping the oldest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Number of subscriber ids deduplicated per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the duplicates')
+
+    def handle(self, *args, **options):
+        removed = delete_duplicate_pings(
+            chunk_size=options['chunk_size'], dry_run=options['dry_run']
+        )
+        verb = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} duplicate pings.'))
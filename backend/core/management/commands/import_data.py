@@ -1,47 +1,38 @@
-import csv
+from django.core.management.base import BaseCommand, CommandError
 
-from datetime import datetime
-from django.core.management.base import BaseCommand
-
-from core.models import State, Subscriber, SubscriberPing
-from django.contrib.gis.geos import Point
+from core.ingestion import CheckpointMismatch, import_file
 
 class Command(BaseCommand):
-    help = 'Command to import subscriber pings from a CSV file'
+    help = 'Command to import subscriber pings from a CSV, Parquet or Arrow file'
 
     def add_arguments(self, parser):
         parser.add_argument('subscriber_name', type=str, help='Subscriber name')
-        parser.add_argument('csv', type=str, help='CSV file path')
+        parser.add_argument('csv', type=str, help='CSV, Parquet (.parquet) or Arrow IPC (.arrow) file path')
+        parser.add_argument('--batch-size', type=int, default=50_000,
+                            help='Rows read, loaded and checkpointed per chunk')
 
     def handle(self, *args, **options):
         subscriber_name = options['subscriber_name']
         csv_path = options['csv']
-        if Subscriber.objects.filter(name=subscriber_name).exists():
-            return
-        print(f"POPULATING NEW DATA FOR {subscriber_name}")
-
-        subscriber = Subscriber.objects.create(name=subscriber_name)
 
-        with open(csv_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    # Assuming you have a State model with a polygon field called 'geom'
+        def on_error(line_num, message):
+            self.stderr.write(f'Error processing line {line_num}: {message}')
 
-                    point = Point(float(row['Longitude']), float(row['Latitude']))
-                    state = State.objects.filter(geom__contains=point).first()
-
-                    SubscriberPing.objects.create(
-                        subscriber=subscriber,
-                        utc_time=datetime.strptime(row['UTCDateTime'], "%m/%d/%y %H:%M"),
-                        cell_type=row['CellType'],
-                        geom=point,
-                        state=state
-                    )
-                except Exception as e:
-                    self.stderr.write(f'Error processing row {row}: {e}')
+        try:
+            stats = import_file(subscriber_name, csv_path,
+                                batch_size=options['batch_size'], on_error=on_error)
+        except CheckpointMismatch as e:
+            raise CommandError(str(e))
+        if stats is None:
+            self.stdout.write(f'{csv_path} already imported for {subscriber_name}, skipping')
+            return
+        if stats.resumed_rows:
+            self.stdout.write(f'Resumed after {stats.resumed_rows} already committed rows')
 
         self.stdout.write(f'Subscriber Name: {subscriber_name}')
         self.stdout.write(f'CSV File Path: {csv_path}')
-        self.stdout.write(f'Created Subscriber: {Subscriber.objects.all().count()}')
-        self.stdout.write(f'Created Subscriber Pings: {SubscriberPing.objects.all().count()}')
+        self.stdout.write(
+            f'Imported {stats.inserted} pings in {stats.seconds:.1f}s '
+            f'({stats.rows_per_sec:,.0f} rows/s), '
+            f'{stats.duplicates} duplicates skipped, {stats.errors} rows rejected'
+        )
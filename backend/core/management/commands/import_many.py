@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingestion.loader import LoadStats
+from core.ingestion.parallel import import_files, read_tasks
+
+
+class Command(BaseCommand):
+    help = 'Import many subscriber CSV files in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', type=str,
+                            help='Directory of <subscriber>.csv/.parquet/.arrow files or a manifest CSV '
+                                 'with "subscriber" and "path" columns')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (one DB connection each)')
+        parser.add_argument('--batch-size', type=int, default=50_000,
+                            help='Rows read, loaded and checkpointed per chunk')
+
+    def handle(self, *args, **options):
+        tasks = read_tasks(options['source'])
+        if not tasks:
+            raise CommandError(f"No CSV files found in {options['source']}")
+
+        started = time.perf_counter()
+        total = LoadStats()
+        failed = skipped = 0
+        for done, result in enumerate(
+            import_files(tasks, options['workers'], options['batch_size']), start=1
+        ):
+            prefix = f'[{done}/{len(tasks)}] {result.subscriber_name}'
+            if result.error:
+                failed += 1
+                self.stderr.write(f'{prefix}: FAILED {result.path}\n{result.error}')
+            elif result.skipped:
+                skipped += 1
+                self.stdout.write(f'{prefix}: already imported, skipped')
+            else:
+                stats = result.stats
+                total.merge(stats)
+                self.stdout.write(
+                    f'{prefix}: {stats.inserted:,} pings in {stats.seconds:.1f}s '
+                    f'({stats.rows_per_sec:,.0f} rows/s), '
+                    f'{stats.duplicates} duplicates skipped, {stats.errors} rows rejected'
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(tasks) - failed - skipped} files imported, {skipped} skipped, {failed} failed: '
+            f'{total.inserted:,} pings in {elapsed:.1f}s '
+            f'({total.rows / elapsed if elapsed else 0:,.0f} rows/s overall), '
+            f'{total.duplicates} duplicates skipped, {total.errors} rows rejected'
+        ))
+        if failed:
+            raise CommandError(f'{failed} of {len(tasks)} files failed')
@@ -8,16 +8,36 @@ from django.contrib.gis.gdal import DataSource
 from django.contrib.gis.geos import GEOSGeometry,MultiPolygon
 import requests
 
+from core.ingestion import assign_states, invalidate_state_locator
 from core.models import State
 
 class Command(BaseCommand):
     help = 'Import USA states to database'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--update', action='store_true',
+                            help='Refresh existing boundaries and re-resolve the affected pings')
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        if State.objects.all().exists():
+        if State.objects.all().exists() and not options['update']:
             return
+        with transaction.atomic():
+            changed = self.import_states()
+        # bulk_create does not send post_save
+        invalidate_state_locator()
+
+        if changed and options['update']:
+            assigned = assign_states(reset_states=changed)
+            self.stdout.write(
+                f"Re-resolved {assigned} pings for {len(changed)} changed states."
+            )
+
+    def import_states(self):
+        """
+        Downloads the Census shapefile, upserts every state and returns the
+        codes whose boundary is new or different.
+        """
+        previous = dict(State.objects.values_list("state_code", "geom"))
         # Download US states shapefile from US Census Bureau
         url = "https://www2.census.gov/geo/tiger/GENZ2023/shp/cb_2023_us_state_500k.zip"
         with tempfile.TemporaryDirectory() as td:
@@ -48,6 +68,12 @@ class Command(BaseCommand):
                     geom = MultiPolygon(geom)
                 objs.append(State(state_code=code, name=name, geom=geom))
 
+            changed = [
+                obj.state_code for obj in objs
+                if obj.state_code not in previous
+                or not previous[obj.state_code].equals_exact(obj.geom)
+            ]
+
             State.objects.bulk_create(
                 objs,
                 update_conflicts=True,
@@ -56,4 +82,5 @@ class Command(BaseCommand):
             )
             self.stdout.write(
                 self.style.SUCCESS(f"Imported/updated {len(objs)} states.")
-            )
\ No newline at end of file
+            )
+        return changed
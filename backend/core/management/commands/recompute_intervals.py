@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.algorithms import LocationInferenceModel, recompute_intervals
+
+
+class Command(BaseCommand):
+    help = 'Fold pings added since the last run into the stored location intervals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', type=int, action='append', dest='methods',
+                            help='Only recompute this method id (repeatable, default: all)')
+        parser.add_argument('--full', action='store_true',
+                            help='Ignore the watermark and recompute every subscriber')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of subscribers inferred per batch')
+
+    def handle(self, *args, **options):
+        methods = options['methods'] or sorted(LocationInferenceModel._registry)
+        for method_id in methods:
+            stats = recompute_intervals(
+                method_id, full=options['full'], chunk_size=options['chunk_size']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Method {method_id}: {stats.intervals} intervals for '
+                f'{stats.subscribers} subscribers, up to ping {stats.last_ping_id}.'
+            ))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_subscriberping_cell_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=1024)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('byte_offset', models.BigIntegerField(default=0)),
+                ('rows_done', models.BigIntegerField(default=0)),
+                ('chunk_offset', models.BigIntegerField(default=0)),
+                ('chunk_hash', models.CharField(blank=True, max_length=64)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subscriber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='imports', to='core.subscriber')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('subscriber', 'fingerprint'), name='core_import_checkpoint_file')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+def drop_invalid_index(apps, schema_editor):
+    # a failed CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS
+    # would keep and the constraint could not use
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid) AND NOT i.indisvalid",
+            ["core_ping_natural_key"],
+        )
+        invalid = cursor.fetchone() is not None
+    if invalid:
+        schema_editor.execute("DROP INDEX CONCURRENTLY core_ping_natural_key")
+
+
+class Migration(migrations.Migration):
+    """
+    Existing duplicates must be removed first with ``manage.py dedupe_pings``.
+    The index is built CONCURRENTLY and then attached as the constraint, so
+    writes are not blocked while it builds; what a failed build left behind
+    is dropped first, so the migration can simply be run again.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_invalid_index, migrations.RunPython.noop),
+                migrations.RunSQL(
+                    sql=(
+                        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS core_ping_natural_key "
+                        "ON core_subscriberping (subscriber_id, utc_time, cell_type, geom)"
+                    ),
+                    reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS core_ping_natural_key",
+                ),
+                migrations.RunSQL(
+                    sql=(
+                        "ALTER TABLE core_subscriberping ADD CONSTRAINT core_ping_natural_key "
+                        "UNIQUE USING INDEX core_ping_natural_key"
+                    ),
+                    reverse_sql="ALTER TABLE core_subscriberping DROP CONSTRAINT core_ping_natural_key",
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='subscriberping',
+                    constraint=models.UniqueConstraint(fields=('subscriber', 'utc_time', 'cell_type', 'geom'), name='core_ping_natural_key'),
+                ),
+            ],
+        ),
+    ]
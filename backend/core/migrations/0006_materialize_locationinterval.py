@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:05
+
+import core.models
+import django.contrib.postgres.constraints
+import django.db.models.deletion
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    ``LocationInterval`` was unmanaged and never had a table; switching it to
+    managed only changes its options, so the model is re-created instead.
+    """
+
+    dependencies = [
+        ('core', '0005_subscriberping_core_ping_natural_key'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.DeleteModel(
+            name='LocationInterval',
+        ),
+        migrations.CreateModel(
+            name='LocationInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval_start', models.DateTimeField()),
+                ('interval_end', models.DateTimeField()),
+                ('ping_count', models.PositiveIntegerField(default=0)),
+                ('confidence_pct', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('method', models.PositiveSmallIntegerField(choices=[(1, 'Majority vote'), (2, 'Clustering + smoothing'), (3, 'Bayesian HMM')])),
+                ('state', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.state')),
+                ('subscriber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intervals', to='core.subscriber')),
+            ],
+            options={
+                'ordering': ['subscriber', 'method', 'interval_start'],
+                'indexes': [models.Index(fields=['subscriber', 'method', 'interval_start'], name='core_locati_subscri_74ad11_idx')],
+                'constraints': [django.contrib.postgres.constraints.ExclusionConstraint(expressions=[(core.models.TsTzRange('interval_start', 'interval_end', models.Value('[)')), '&&'), ('subscriber', '='), ('method', '=')], name='core_interval_no_overlap')],
+            },
+        ),
+        migrations.CreateModel(
+            name='IntervalWatermark',
+            fields=[
+                ('method', models.PositiveSmallIntegerField(choices=[(1, 'Majority vote'), (2, 'Clustering + smoothing'), (3, 'Bayesian HMM')], primary_key=True, serialize=False)),
+                ('last_ping_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
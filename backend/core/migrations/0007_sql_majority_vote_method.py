@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_materialize_locationinterval'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='intervalwatermark',
+            name='method',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Majority vote'), (2, 'Clustering + smoothing'), (3, 'Bayesian HMM'), (4, 'Majority vote (SQL)')], primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='locationinterval',
+            name='method',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Majority vote'), (2, 'Clustering + smoothing'), (3, 'Bayesian HMM'), (4, 'Majority vote (SQL)')]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_sql_majority_vote_method'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='intervalwatermark',
+            name='method',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Majority vote'), (2, 'Clustering + smoothing'), (3, 'Bayesian HMM'), (4, 'Majority vote (SQL)'), (5, 'Clustering + smoothing (PostGIS)')], primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='locationinterval',
+            name='method',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Majority vote'), (2, 'Clustering + smoothing'), (3, 'Bayesian HMM'), (4, 'Majority vote (SQL)'), (5, 'Clustering + smoothing (PostGIS)')]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sql_clustering_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='pings_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+def drop_invalid_index(apps, schema_editor):
+    # left behind by a failed CONCURRENTLY build of this migration
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid) AND NOT i.indisvalid",
+            ["core_ping_natural_key_nn"],
+        )
+        invalid = cursor.fetchone() is not None
+    if invalid:
+        schema_editor.execute("DROP INDEX CONCURRENTLY core_ping_natural_key_nn")
+
+
+class Migration(migrations.Migration):
+    """
+    Pings without a subscriber now share one natural key space instead of
+    never conflicting (PostgreSQL 15+).  Their duplicates must be removed
+    first with ``manage.py dedupe_pings``.  The new index is built
+    CONCURRENTLY, then swapped in for the old constraint in one statement.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_subscriber_pings_version'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_invalid_index, migrations.RunPython.noop),
+                migrations.RunSQL(
+                    sql=(
+                        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS core_ping_natural_key_nn "
+                        "ON core_subscriberping (subscriber_id, utc_time, cell_type, geom) "
+                        "NULLS NOT DISTINCT"
+                    ),
+                    reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS core_ping_natural_key_nn",
+                ),
+                migrations.RunSQL(
+                    sql=(
+                        "ALTER TABLE core_subscriberping "
+                        "DROP CONSTRAINT core_ping_natural_key, "
+                        "ADD CONSTRAINT core_ping_natural_key UNIQUE USING INDEX core_ping_natural_key_nn"
+                    ),
+                    reverse_sql=(
+                        "ALTER TABLE core_subscriberping "
+                        "DROP CONSTRAINT core_ping_natural_key, "
+                        "ADD CONSTRAINT core_ping_natural_key "
+                        "UNIQUE (subscriber_id, utc_time, cell_type, geom)"
+                    ),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name='subscriberping',
+                    name='core_ping_natural_key',
+                ),
+                migrations.AddConstraint(
+                    model_name='subscriberping',
+                    constraint=models.UniqueConstraint(fields=('subscriber', 'utc_time', 'cell_type', 'geom'), name='core_ping_natural_key', nulls_distinct=False),
+                ),
+            ],
+        ),
+    ]
@@ -1,6 +1,10 @@
 from dataclasses import dataclass
 from typing import List
 from django.contrib.gis.db import models
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 from django.contrib.postgres.indexes import GistIndex
 
 
@@ -26,6 +30,9 @@ class Subscriber(models.Model):
     """
     id = models.BigAutoField(primary_key=True)
     name = models.CharField(max_length=255, blank=True) 
+    # bumped with every write to the subscriber's pings, in the same
+    # transaction, so caches keyed on it never serve older pings
+    pings_version = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return str(self.id)
@@ -56,30 +63,111 @@ class SubscriberPing(models.Model):
             models.Index(fields=["subscriber", "utc_time"]),
             GistIndex(fields=["geom"]),
         ]
+        constraints = [
+            # natural key: re-importing a feed must not double the pings,
+            # pings without a subscriber included
+            models.UniqueConstraint(fields=["subscriber", "utc_time", "cell_type", "geom"],
+                                    name="core_ping_natural_key", nulls_distinct=False),
+        ]
 
     def __str__(self) -> str:
         return f"{self.subscriber_id}@{self.utc_time:%F %T}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of one carrier file import, committed together with every
+    chunk so an interrupted import resumes right after the last chunk.
+    """
+    subscriber   = models.ForeignKey(Subscriber, on_delete=models.CASCADE,
+                                     related_name="imports")
+    source       = models.CharField(max_length=1024)
+    fingerprint  = models.CharField(max_length=64)   # sha256 of the first block
+    byte_offset  = models.BigIntegerField(default=0)
+    rows_done    = models.BigIntegerField(default=0)
+    chunk_offset = models.BigIntegerField(default=0)  # start of the last chunk
+    chunk_hash   = models.CharField(max_length=64, blank=True)
+    completed    = models.BooleanField(default=False)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["subscriber", "fingerprint"],
+                                    name="core_import_checkpoint_file"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subscriber_id}:{self.source}@{self.rows_done}"
     
 
+class TsTzRange(models.Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
 class LocationInterval(models.Model):
     """
     A continuous stay inside one state, produced by one of the
     post-processing algorithms (majority vote, clustering, HMM, …).
-    Overlaps per subscriber are forbidden by an exclusion constraint.
+    Overlaps per subscriber and method are forbidden by an exclusion
+    constraint.
     """
     class Method(models.IntegerChoices):
         MAJORITY_VOTE = 1, "Majority vote"
         CLUSTERING    = 2, "Clustering + smoothing"
+        HMM           = 3, "Bayesian HMM"
+        SQL_MAJORITY_VOTE = 4, "Majority vote (SQL)"
+        SQL_CLUSTERING    = 5, "Clustering + smoothing (PostGIS)"
 
-    subscriber      = models.ForeignKey(Subscriber, on_delete=models.DO_NOTHING,
+    subscriber      = models.ForeignKey(Subscriber, on_delete=models.CASCADE,
                                         related_name="intervals")
     subscriber_pings: List[SubscriberPing]
     interval_start  = models.DateTimeField()
     interval_end    = models.DateTimeField()
     ping_count      = models.PositiveIntegerField(default=0)
-    state           = models.ForeignKey(State, on_delete=models.PROTECT)
+    state           = models.ForeignKey(State, on_delete=models.PROTECT,
+                                        null=True, blank=True)
     confidence_pct  = models.DecimalField(max_digits=5, decimal_places=2)  # 0–100
     method          = models.PositiveSmallIntegerField(choices=Method.choices)
 
     class Meta:
-        managed = False
\ No newline at end of file
+        ordering = ["subscriber", "method", "interval_start"]
+        indexes = [
+            models.Index(fields=["subscriber", "method", "interval_start"]),
+        ]
+        constraints = [
+            ExclusionConstraint(
+                name="core_interval_no_overlap",
+                expressions=[
+                    (TsTzRange("interval_start", "interval_end", models.Value("[)")),
+                     RangeOperators.OVERLAPS),
+                    ("subscriber", RangeOperators.EQUAL),
+                    ("method", RangeOperators.EQUAL),
+                ],
+            ),
+        ]
+
+
+class IntervalWatermark(models.Model):
+    """
+    Last ping whose effect on the stored intervals of ``method`` has been
+    computed; pings with a higher id are still to be folded in.
+    """
+    method       = models.PositiveSmallIntegerField(primary_key=True,
+                                                    choices=LocationInterval.Method.choices)
+    last_ping_id = models.BigIntegerField(default=0)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.get_method_display()}@{self.last_ping_id}"
+
+    @classmethod
+    def rewind(cls, ping_id: int, using: str = DEFAULT_DB_ALIAS) -> None:
+        """
+        Marks every method as not having folded in ``ping_id`` and later
+        pings, after they changed in place; the next recompute re-infers
+        their ranges and until then they are inferred on request.
+        """
+        cls.objects.using(using).filter(last_ping_id__gte=ping_id).update(
+            last_ping_id=ping_id - 1, updated_at=timezone.now()
+        )
@@ -0,0 +1,196 @@
+"""
+Keyset (cursor) pagination.
+
+A page continues right after the ordering key of the previous page's last
+row — ``(utc_time, ping_id)`` for pings, ``id`` for subscribers — so every
+page is a range scan of the matching index whatever its depth, unlike an
+``OFFSET`` that reads and drops every row before the page.  Cursors are
+opaque url-safe tokens holding that key.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+from math import ceil
+from typing import List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q, Window
+from django.db.models.functions import Mod, RowNumber
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.serializers import FlatPingSerializer, FlatSubscriberPingSerializer
+
+PING_ORDER = ("utc_time", "ping_id")
+
+
+def encode_cursor(*key) -> str:
+    raw = "|".join(str(value) for value in key).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> List[str]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        return raw.decode().split("|")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise NotFound("Invalid cursor.")
+
+
+def keyset_filter(model, ordering: Sequence[str], key: Sequence[str]) -> Q:
+    """
+    Rows strictly after ``key`` in ``ordering`` (field names, ``-`` for
+    descending).  The range on the leading field lets the database seek
+    the index; the rest breaks its ties.
+    """
+    fields = [name.lstrip("-") for name in ordering]
+    descending = [name.startswith("-") for name in ordering]
+    if len(key) != len(fields):
+        raise NotFound("Invalid cursor.")
+    try:
+        values = [model._meta.get_field(name).to_python(value) for name, value in zip(fields, key)]
+    except ValidationError:
+        raise NotFound("Invalid cursor.")
+    after = Q()
+    for name, desc, value in reversed(list(zip(fields, descending, values))):
+        strict = Q(**{f"{name}__{'lt' if desc else 'gt'}": value})
+        after = strict | (Q(**{name: value}) & after) if after else strict
+    seek = Q(**{f"{fields[0]}__{'lte' if descending[0] else 'gte'}": values[0]})
+    return seek & after
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages of ``page_size`` rows (``?page_size=``, capped) in ``ordering``,
+    which must end on a unique field, with a ``next`` link carrying the
+    cursor.  Page sizes come from ``settings.PAGINATION``.  With a
+    ``row_serializer`` (a ``FlatSerializer``) pages are serialized rows
+    rather than model instances.
+    """
+    ordering: Tuple[str, ...] = ("id",)
+    row_serializer = None
+    page_size_setting = "PAGE_SIZE"
+    max_page_size_setting = "MAX_PAGE_SIZE"
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+
+    def get_page_size(self, request) -> int:
+        page_size = settings.PAGINATION[self.page_size_setting]
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            pass
+        return max(1, min(page_size, settings.PAGINATION[self.max_page_size_setting]))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        page, self.next_cursor = self.page(queryset, cursor, self.get_page_size(request))
+        return page
+
+    def page(self, queryset, cursor: Optional[str], page_size: int) -> Tuple[list, Optional[str]]:
+        """
+        Returns the ``page_size`` rows after ``cursor`` (the first ones
+        without) and the cursor of the next page, ``None`` on the last page.
+        """
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(
+                keyset_filter(queryset.model, self.ordering, decode_cursor(cursor))
+            )
+        rows = self.fetch(queryset[:page_size + 1])
+        if len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        return rows, encode_cursor(*self.key(rows[-1]))
+
+    def fetch(self, queryset) -> list:
+        if self.row_serializer is not None:
+            return self.row_serializer(queryset).data
+        return list(queryset)
+
+    def key(self, row) -> list:
+        fields = [name.lstrip("-") for name in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in fields]
+        return [getattr(row, name) for name in fields]
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class SubscriberPagination(KeysetPagination):
+    ordering = ("id",)
+
+
+class PingPagination(KeysetPagination):
+    """
+    Latest pings first, like ``SubscriberPing.Meta.ordering``.
+    """
+    ordering = ("-utc_time", "-ping_id")
+    page_size_setting = "PING_PAGE_SIZE"
+    max_page_size_setting = "PING_MAX_PAGE_SIZE"
+    row_serializer = FlatSubscriberPingSerializer
+
+
+class FlatPingPagination(PingPagination):
+    """
+    One subscriber's pings in time order.
+    """
+    ordering = PING_ORDER
+    row_serializer = FlatPingSerializer
+
+
+def sample_pings(pings, limit: int) -> list:
+    """
+    Returns at most ``limit`` flat pings spread evenly over ``pings`` in time
+    order; the database numbers the rows and only the sample is fetched.
+    """
+    step = ceil(pings.count() / limit)
+    if step <= 1:
+        return FlatPingSerializer(pings.order_by(*PING_ORDER)[:limit]).data
+    sampled = (
+        pings.order_by(*PING_ORDER)
+        .annotate(_row=Window(RowNumber(), order_by=[F(field).asc() for field in PING_ORDER]))
+        .annotate(_skip=Mod(F("_row") - 1, step))
+        .filter(_skip=0)
+    )
+    return FlatPingSerializer(sampled).data
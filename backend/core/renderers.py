@@ -0,0 +1,87 @@
+"""
+Response renderers.
+
+JSON is encoded with orjson.  Ping and interval endpoints also negotiate
+MessagePack and Arrow IPC (``Accept`` header or ``?format=msgpack|arrow``),
+which clients decode without parsing text; Arrow is columnar, with string
+columns such as ``state`` and ``cell_type`` dictionary-encoded.
+"""
+from __future__ import annotations
+
+import msgpack
+import orjson
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# DRF's fallbacks (Decimal, lazy strings, UUIDs, querysets, …) for the
+# values orjson and msgpack have no native encoding for
+_encoder = JSONEncoder()
+
+
+def _dumps(data, option: int = 0) -> bytes:
+    return orjson.dumps(data, default=_encoder.default,
+                        option=option | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` output, encoded by orjson.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return _dumps(data, orjson.OPT_INDENT_2 if indent else 0)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
+
+
+class ArrowRenderer(BaseRenderer):
+    """
+    One Arrow IPC stream of the rows of a response: a page's ``results`` or
+    an inference's ``intervals`` (any other response is a single row).  The
+    remaining top-level keys (``next``, the summary interval, …) are JSON
+    values in the schema metadata.
+    """
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
+
+    TABLE_KEYS = ("results", "intervals")
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows, metadata = data, {}
+        if isinstance(data, dict):
+            key = next((key for key in self.TABLE_KEYS if key in data), None)
+            rows = data[key] if key else [data]
+            metadata = {name: _dumps(value) for name, value in data.items() if name != key}
+        table = pa.Table.from_pylist(list(rows))
+        columns = [
+            column.dictionary_encode() if pa.types.is_string(column.type) else column
+            for column in table.columns
+        ]
+        table = pa.Table.from_arrays(columns, names=table.column_names, metadata=metadata)
+        sink = pa.BufferOutputStream()
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+# negotiated on top of the default renderers by ping and interval endpoints
+DATA_RENDERERS = (MessagePackRenderer, ArrowRenderer)
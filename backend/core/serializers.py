@@ -1,5 +1,12 @@
+from operator import attrgetter
+from typing import Iterable, Optional
+
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
+from django.db.models import QuerySet
 from rest_framework import serializers
 
+from core.algorithms.arrays import PointX, PointY
+from core.ingestion import get_state_locator
 from core.models import (  
     State,
     Subscriber,
@@ -15,19 +22,150 @@ class StateSerializer(serializers.ModelSerializer):
 class SubscriberSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscriber
-        fields = '__all__'
+        exclude = ('pings_version',)
 
 class SubscriberPingSerializer(serializers.ModelSerializer):
     class Meta:
         model = SubscriberPing
         fields = '__all__'
+        # duplicates are resolved by the upsert, not rejected
+        validators = []
+
+    def validate_geom(self, value):
+        if isinstance(value, str):
+            try:
+                value = GEOSGeometry(value, srid=4326)
+            except (GEOSException, ValueError):
+                raise serializers.ValidationError("Invalid geometry.")
+        if value.geom_type != "Point":
+            raise serializers.ValidationError("Expected a Point geometry.")
+        return value
+
+    def validate(self, attrs):
+        # resolve the state in memory when the client does not send one
+        if attrs.get("state") is None and attrs.get("geom") is not None:
+            attrs.pop("state", None)
+            attrs["state_id"] = get_state_locator().locate_one(attrs["geom"].x, attrs["geom"].y)
+        return attrs
+
+
+class FlatSerializer:
+    """
+    Read-only serializer for hot read paths, built from ``values_list``
+    tuples instead of ``ModelSerializer`` fields.  ``columns`` maps every
+    output key to a model attribute or a database expression once per class
+    and ``converters`` post-process a few columns, so a queryset is one
+    query and a ``dict(zip())`` per row.  Lists of model instances (inferred
+    intervals) are read with one ``attrgetter``.
+    """
+    columns: dict = {}
+    converters: dict = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.field_names = tuple(cls.columns)
+        cls.annotations = {
+            f"_{name}": column for name, column in cls.columns.items() if not isinstance(column, str)
+        }
+        cls.selected = tuple(
+            column if isinstance(column, str) else f"_{name}" for name, column in cls.columns.items()
+        )
+        cls.conversions = [
+            (i, cls.converters[name]) for i, name in enumerate(cls.field_names) if name in cls.converters
+        ]
+
+    def __init__(self, instance, many: bool = True):
+        self.instance = instance
+
+    @classmethod
+    def values_list(cls, queryset):
+        return queryset.annotate(**cls.annotations).values_list(*cls.selected)
+
+    def _convert(self, row: tuple) -> tuple:
+        row = list(row)
+        for i, convert in self.conversions:
+            if row[i] is not None:
+                row[i] = convert(row[i])
+        return tuple(row)
+
+    def tuples(self, chunk_size: Optional[int] = None) -> Iterable[tuple]:
+        """
+        Output rows as tuples in ``field_names`` order; with ``chunk_size`` a
+        queryset is read through a server-side cursor.
+        """
+        if isinstance(self.instance, QuerySet):
+            rows = self.values_list(self.instance)
+            if chunk_size:
+                rows = rows.iterator(chunk_size=chunk_size)
+        else:
+            rows = map(attrgetter(*self.selected), self.instance)
+        return map(self._convert, rows) if self.conversions else rows
+
+    @property
+    def data(self) -> list:
+        names = self.field_names
+        return [dict(zip(names, row)) for row in self.tuples()]
+
+
+class FlatPingSerializer(FlatSerializer):
+    """
+    Pings with ``lon``/``lat`` floats computed by the database, no GEOS.
+    """
+    columns = {
+        "ping_id": "ping_id",
+        "utc_time": "utc_time",
+        "cell_type": "cell_type",
+        "state": "state_id",
+        "lon": PointX("geom"),
+        "lat": PointY("geom"),
+    }
+
+
+class FlatSubscriberPingSerializer(FlatSerializer):
+    columns = {"subscriber": "subscriber_id", **FlatPingSerializer.columns}
+
+
+class FlatStateSerializer(FlatSerializer):
+    columns = {
+        "state_code": "state_code",
+        "name": "name",
+        "geom": "geom",
+    }
+    # GEOS EWKT, byte for byte what StateSerializer renders
+    converters = {"geom": str}
+
+
+class FlatIntervalSerializer(FlatSerializer):
+    """
+    ``LocationIntervalSerializer`` output, from a queryset or inferred
+    intervals.
+    """
+    columns = {
+        "subscriber": "subscriber_id",
+        "interval_start": "interval_start",
+        "interval_end": "interval_end",
+        "ping_count": "ping_count",
+        "state": "state_id",
+        "confidence_pct": "confidence_pct",
+        "method": "method",
+    }
+    converters = {"confidence_pct": "{:.2f}".format}
 
 
 class LocationIntervalSerializer(serializers.ModelSerializer):
-    pings = serializers.SerializerMethodField()
     class Meta:
         model = LocationInterval
         exclude = ['id']
 
-    def get_pings(self, obj):
-        return SubscriberPingSerializer(self.context.get("pings"), many=True).data
\ No newline at end of file
+
+class InferenceSerializer(LocationIntervalSerializer):
+    """
+    Summary interval of an inference, with its full timeline.
+    """
+    intervals = serializers.SerializerMethodField()
+
+    class Meta(LocationIntervalSerializer.Meta):
+        pass
+
+    def get_intervals(self, obj):
+        return FlatIntervalSerializer(self.context.get("intervals", [])).data
\ No newline at end of file
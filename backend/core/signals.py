@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import inference_cache
+from core.ingestion.locator import invalidate_state_locator
+from core.models import State, SubscriberPing
+
+
+@receiver([post_save, post_delete], sender=State)
+def state_changed(sender, **kwargs):
+    # boundaries changed, the in-memory point → state index is stale
+    invalidate_state_locator()
+
+
+@receiver([post_save, post_delete], sender=SubscriberPing)
+def ping_changed(sender, instance, **kwargs):
+    # ORM writes; bulk paths invalidate from the loader and the upsert
+    inference_cache.invalidate([instance.subscriber_id])
@@ -10,6 +10,7 @@ from core.tests.algorithms_tests import *
 from core.tests.endpoints_tests import *
 from core.tests.integration_tests import *
 from core.tests.performance_tests import *
+from core.tests.ingestion_tests import *
 
 # Make test classes available at package level
 __all__ = [
@@ -23,6 +24,7 @@ __all__ = [
     'AlgorithmTests',
     'MajorityVoteAlgorithmTests',
     'ClusteringAlgorithmTests',
+    'IntervalStorageTests',
     
     # API tests
     'APITests',
@@ -37,4 +39,13 @@ __all__ = [
     # Performance tests
     'PerformanceTests',
     'ScalabilityTests',
+
+    # Ingestion tests
+    'ImportDataCommandTests',
+    'ReadTasksTests',
+    'ParallelImportTests',
+    'DedupePingsTests',
+    'AssignStatesTests',
+    'StateLocatorTests',
+    'IngestQueueTests',
 ]
\ No newline at end of file
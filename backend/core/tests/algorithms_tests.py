@@ -1,13 +1,20 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.forms import ValidationError
 from django.test import TestCase
 from django.contrib.gis.geos import Point, MultiPolygon, Polygon
 from django.utils import timezone
 from datetime import timedelta
 
-from core.models import State, Subscriber, SubscriberPing, LocationInterval
-from core.algorithms import LocationInferenceModel
+from core.models import IntervalWatermark, State, Subscriber, SubscriberPing, LocationInterval
+from core.algorithms import LocationInferenceModel, recompute_intervals, stored_timeline
 from core.algorithms.majority_vote import MajorityVoteModel
 from core.algorithms.clustering import ClusteringModel
+from core.algorithms.hmm import HMMModel
+from core.algorithms.sql_majority_vote import SqlMajorityVoteModel
+from core.algorithms.sql_clustering import SqlClusteringModel
 
 class AlgorithmTests(TestCase):
     """Test cases for location inference algorithms"""
@@ -42,14 +49,19 @@ class AlgorithmTests(TestCase):
         # Check that algorithms are registered
         self.assertIn(LocationInterval.Method.MAJORITY_VOTE, LocationInferenceModel._registry)
         self.assertIn(LocationInterval.Method.CLUSTERING, LocationInferenceModel._registry)
+        self.assertIn(LocationInterval.Method.HMM, LocationInferenceModel._registry)
+        self.assertIn(LocationInterval.Method.SQL_MAJORITY_VOTE, LocationInferenceModel._registry)
+        self.assertIn(LocationInterval.Method.SQL_CLUSTERING, LocationInferenceModel._registry)
         
     def test_get_algorithm(self):
         """Test getting algorithm by method ID"""
         majority_vote = LocationInferenceModel.get(LocationInterval.Method.MAJORITY_VOTE.value)
         clustering = LocationInferenceModel.get(LocationInterval.Method.CLUSTERING.value)
+        hmm = LocationInferenceModel.get(LocationInterval.Method.HMM.value)
         
         self.assertIsInstance(majority_vote, MajorityVoteModel)
         self.assertIsInstance(clustering, ClusteringModel)
+        self.assertIsInstance(hmm, HMMModel)
         
     def test_majority_vote_algorithm(self):
         """Test majority vote algorithm"""
@@ -57,22 +69,364 @@ class AlgorithmTests(TestCase):
         
         # Test with our test pings
         pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
-        interval = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+        intervals = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+        interval = algorithm.summarize(intervals)
         
         self.assertIsInstance(interval, LocationInterval)
         self.assertEqual(interval.subscriber, self.subscriber)
         self.assertEqual(interval.method, LocationInterval.Method.MAJORITY_VOTE)
         self.assertEqual(interval.ping_count, 5)
+
+    def test_majority_vote_single_query(self):
+        """Test that majority vote needs one query"""
+        SubscriberPing.objects.create(
+            subscriber=self.subscriber,
+            utc_time=self.pings[-1].utc_time + timedelta(minutes=10),
+            cell_type=SubscriberPing.CellType.DATA,
+            geom=Point(10, 10),
+        )
+        algorithm = MajorityVoteModel()
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+
+        with self.assertNumQueries(1):
+            intervals = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+        interval = algorithm.summarize(intervals)
+
+        self.assertEqual(interval.state_id, "NY")
+        self.assertEqual(interval.ping_count, 6)
+        self.assertEqual(interval.interval_start, self.pings[0].utc_time)
+        self.assertEqual(interval.interval_end, self.pings[-1].utc_time + timedelta(minutes=10))
+
+    def test_majority_vote_timeline(self):
+        """Test that the sliding window yields one interval per stay"""
+        other = State.objects.create(
+            state_code="PA",
+            name="Pennsylvania",
+            geom=MultiPolygon(Polygon(((1, 0), (1, 1), (2, 1), (2, 0), (1, 0)))),
+        )
+        start = self.pings[-1].utc_time + timedelta(minutes=10)
+        states = [other] * 2 + [self.state] + [other] * 5
+        for i, state in enumerate(states):
+            SubscriberPing.objects.create(
+                subscriber=self.subscriber,
+                utc_time=start + timedelta(minutes=i * 10),
+                cell_type=SubscriberPing.CellType.DATA,
+                geom=Point(1.5, 0.5),
+                state=state,
+            )
+        algorithm = MajorityVoteModel(window_sec=1800)
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+
+        intervals = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+
+        self.assertEqual([i.state_id for i in intervals], ["NY", "PA"])
+        self.assertEqual(sum(i.ping_count for i in intervals), 13)
+        self.assertEqual(intervals[0].interval_end, intervals[1].interval_start)
+        self.assertEqual(intervals[0].interval_start, self.pings[0].utc_time)
+        self.assertEqual(intervals[1].interval_end, start + timedelta(minutes=70))
         
+    def test_sql_majority_vote_matches_arrays(self):
+        """Test that the SQL majority vote returns the same timeline in one query"""
+        other = State.objects.create(
+            state_code="PA",
+            name="Pennsylvania",
+            geom=MultiPolygon(Polygon(((1, 0), (1, 1), (2, 1), (2, 0), (1, 0)))),
+        )
+        start = self.pings[-1].utc_time + timedelta(minutes=10)
+        states = [other] * 2 + [self.state] + [other] * 4 + [None]
+        for i, state in enumerate(states):
+            SubscriberPing.objects.create(
+                subscriber=self.subscriber,
+                utc_time=start + timedelta(minutes=i * 10),
+                cell_type=SubscriberPing.CellType.DATA,
+                geom=Point(1.5, 0.5),
+                state=state,
+            )
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+        expected = MajorityVoteModel(window_sec=1800).infer_intervals(
+            self.subscriber, pings=pings_queryset
+        )
+
+        with self.assertNumQueries(1):
+            intervals = SqlMajorityVoteModel(window_sec=1800).infer_intervals(
+                self.subscriber, pings=pings_queryset
+            )
+
+        self.assertEqual(
+            [(i.state_id, i.ping_count, i.interval_start, i.interval_end) for i in intervals],
+            [(i.state_id, i.ping_count, i.interval_start, i.interval_end) for i in expected],
+        )
+        for interval, reference in zip(intervals, expected):
+            self.assertAlmostEqual(float(interval.confidence_pct), reference.confidence_pct, delta=0.01)
+        self.assertEqual(intervals[0].method, LocationInterval.Method.SQL_MAJORITY_VOTE)
+
+    def test_sql_majority_vote_no_pings(self):
+        """Test that the SQL majority vote returns no interval without pings"""
+        intervals = SqlMajorityVoteModel().infer_intervals(
+            self.subscriber, pings=SubscriberPing.objects.none()
+        )
+
+        self.assertEqual(intervals, [])
+
     def test_clustering_algorithm(self):
         """Test clustering algorithm"""
         algorithm = ClusteringModel()
         
         # Test with our test pings
         pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
-        interval = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+        interval = algorithm.summarize(algorithm.infer_intervals(self.subscriber, pings=pings_queryset))
         
         self.assertIsInstance(interval, LocationInterval)
         self.assertEqual(interval.subscriber, self.subscriber)
         self.assertEqual(interval.method, LocationInterval.Method.CLUSTERING)
 
+    def test_clustering_reads_flat_columns(self):
+        """Test that clustering loads coordinates with one query"""
+        algorithm = ClusteringModel()
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+
+        with self.assertNumQueries(1):
+            intervals = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+
+        self.assertEqual(sum(i.ping_count for i in intervals), 5)
+        self.assertEqual(intervals[0].interval_start, self.pings[0].utc_time)
+
+    def test_clustering_timeline(self):
+        """Test that clustering returns one interval per stay, without overlaps"""
+        other = State.objects.create(
+            state_code="PA",
+            name="Pennsylvania",
+            geom=MultiPolygon(Polygon(((1, 0), (1, 1), (2, 1), (2, 0), (1, 0)))),
+        )
+        start = self.pings[-1].utc_time + timedelta(hours=1)
+        for i in range(6):
+            SubscriberPing.objects.create(
+                subscriber=self.subscriber,
+                utc_time=start + timedelta(minutes=i * 10),
+                cell_type=SubscriberPing.CellType.DATA,
+                geom=Point(1.5, 0.5),
+                state=other,
+            )
+        algorithm = ClusteringModel()
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+
+        intervals = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+
+        self.assertEqual([i.state_id for i in intervals], ["NY", "PA"])
+        self.assertEqual([i.ping_count for i in intervals], [5, 6])
+        self.assertLessEqual(intervals[0].interval_end, intervals[1].interval_start)
+        self.assertEqual(intervals[1].interval_end, start + timedelta(minutes=50))
+
+    def test_hmm_timeline(self):
+        """Test that the HMM smooths a flip next to a border"""
+        other = State.objects.create(
+            state_code="PA",
+            name="Pennsylvania",
+            geom=MultiPolygon(Polygon(((1, 0), (1, 1), (2, 1), (2, 0), (1, 0)))),
+        )
+        start = self.pings[-1].utc_time + timedelta(hours=1)
+        for i in range(7):
+            flip = i == 3
+            SubscriberPing.objects.create(
+                subscriber=self.subscriber,
+                utc_time=start + timedelta(minutes=i * 10),
+                cell_type=SubscriberPing.CellType.DATA,
+                geom=Point(0.999, 0.5) if flip else Point(1.5, 0.5),
+                state=self.state if flip else other,
+            )
+        algorithm = HMMModel()
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+
+        intervals = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+
+        self.assertEqual([i.state_id for i in intervals], ["NY", "PA"])
+        self.assertEqual([i.ping_count for i in intervals], [5, 7])
+        self.assertEqual(intervals[0].interval_end, intervals[1].interval_start)
+        self.assertEqual(intervals[0].method, LocationInterval.Method.HMM)
+
+    def test_sql_clustering_matches_clustering(self):
+        """Test that PostGIS clustering returns the scikit-learn timeline in one query"""
+        other = State.objects.create(
+            state_code="PA",
+            name="Pennsylvania",
+            geom=MultiPolygon(Polygon(((1, 0), (1, 1), (2, 1), (2, 0), (1, 0)))),
+        )
+        start = self.pings[-1].utc_time + timedelta(hours=1)
+        # a dense stay, a lone ping outside every state, then a second stay
+        spots = [(1.5, 0.5, other)] * 4 + [(3.0, 3.0, None)] + [(1.501, 0.501, other)] * 3
+        for i, (x, y, state) in enumerate(spots):
+            SubscriberPing.objects.create(
+                subscriber=self.subscriber,
+                utc_time=start + timedelta(minutes=i * 10),
+                cell_type=SubscriberPing.CellType.DATA,
+                geom=Point(x, y),
+                state=state,
+            )
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+        expected = ClusteringModel().infer_intervals(self.subscriber, pings=pings_queryset)
+
+        with self.assertNumQueries(1):
+            intervals = SqlClusteringModel().infer_intervals(self.subscriber, pings=pings_queryset)
+
+        self.assertEqual(
+            [(i.state_id, i.ping_count, i.interval_start, i.interval_end, i.confidence_pct)
+             for i in intervals],
+            [(i.state_id, i.ping_count, i.interval_start, i.interval_end, i.confidence_pct)
+             for i in expected],
+        )
+        self.assertEqual(intervals[0].method, LocationInterval.Method.SQL_CLUSTERING)
+
+    def test_sql_clustering_no_pings(self):
+        """Test that PostGIS clustering returns no interval without pings"""
+        intervals = SqlClusteringModel().infer_intervals(
+            self.subscriber, pings=SubscriberPing.objects.none()
+        )
+
+        self.assertEqual(intervals, [])
+
+    def test_infer_many(self):
+        """Test that batch inference matches per-subscriber inference"""
+        other = Subscriber.objects.create(name="Other User")
+        start = self.pings[0].utc_time
+        for i in range(3):
+            SubscriberPing.objects.create(
+                subscriber=other,
+                utc_time=start + timedelta(minutes=i * 5),
+                cell_type=SubscriberPing.CellType.SMS,
+                geom=Point(0.5, 0.5),
+                state=self.state,
+            )
+        idle = Subscriber.objects.create(name="Idle User")
+        ids = [self.subscriber.pk, other.pk, idle.pk]
+
+        for algorithm in (MajorityVoteModel(), ClusteringModel(), HMMModel()):
+            with self.subTest(algorithm=algorithm.name):
+                timelines = algorithm.infer_many(ids)
+
+                self.assertEqual(set(timelines), set(ids))
+                self.assertEqual(timelines[idle.pk], [])
+                for subscriber in (self.subscriber, other):
+                    expected = algorithm.infer_intervals(subscriber, pings=subscriber.pings.all())
+                    self.assertEqual(
+                        [(i.state_id, i.ping_count, i.interval_start, i.interval_end)
+                         for i in timelines[subscriber.pk]],
+                        [(i.state_id, i.ping_count, i.interval_start, i.interval_end)
+                         for i in expected],
+                    )
+
+    def test_infer_many_single_query(self):
+        """Test that batch inference loads all pings with one query"""
+        algorithm = MajorityVoteModel()
+        time_range = (self.pings[1].utc_time, self.pings[4].utc_time)
+
+        # subscribers + pings
+        with self.assertNumQueries(2):
+            timelines = algorithm.infer_many([self.subscriber.pk], time_range)
+
+        self.assertEqual(sum(i.ping_count for i in timelines[self.subscriber.pk]), 3)
+
+
+class IntervalStorageTests(TestCase):
+    """Test cases for the materialized location intervals"""
+
+    def setUp(self):
+        self.ny = State.objects.create(
+            state_code="NY",
+            name="New York",
+            geom=MultiPolygon(Polygon(((0, 0), (0, 1), (1, 1), (1, 0), (0, 0)))),
+        )
+        self.pa = State.objects.create(
+            state_code="PA",
+            name="Pennsylvania",
+            geom=MultiPolygon(Polygon(((1, 0), (1, 1), (2, 1), (2, 0), (1, 0)))),
+        )
+        self.subscriber = Subscriber.objects.create(name="Test User")
+        self.other = Subscriber.objects.create(name="Other User")
+        self.start = timezone.now().replace(microsecond=0)
+        for i in range(4):
+            self.ping(self.subscriber, self.start + timedelta(minutes=i * 10), self.ny)
+            self.ping(self.other, self.start + timedelta(minutes=i * 10), self.pa)
+
+    def ping(self, subscriber, utc_time, state):
+        return SubscriberPing.objects.create(
+            subscriber=subscriber,
+            utc_time=utc_time,
+            cell_type=SubscriberPing.CellType.DATA,
+            geom=Point(0.5, 0.5) if state == self.ny else Point(1.5, 0.5),
+            state=state,
+        )
+
+    def stored(self, subscriber):
+        return [
+            (i.state_id, i.ping_count, i.interval_start, i.interval_end)
+            for i in LocationInterval.objects.filter(
+                subscriber=subscriber, method=LocationInterval.Method.MAJORITY_VOTE
+            ).order_by("interval_start")
+        ]
+
+    def inferred(self, subscriber):
+        return [
+            (i.state_id, i.ping_count, i.interval_start, i.interval_end)
+            for i in MajorityVoteModel().infer_intervals(subscriber, pings=subscriber.pings.all())
+        ]
+
+    def test_recompute_stores_timelines(self):
+        """Test that a first recompute stores every subscriber's timeline"""
+        stats = recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+
+        self.assertEqual(stats.subscribers, 2)
+        self.assertEqual(self.stored(self.subscriber), self.inferred(self.subscriber))
+        self.assertEqual(self.stored(self.other), self.inferred(self.other))
+        watermark = IntervalWatermark.objects.get(method=LocationInterval.Method.MAJORITY_VOTE)
+        self.assertEqual(watermark.last_ping_id, SubscriberPing.objects.latest("ping_id").ping_id)
+
+    def test_recompute_only_new_pings(self):
+        """Test that an incremental recompute only re-infers touched subscribers"""
+        recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+        untouched = list(LocationInterval.objects.filter(subscriber=self.other))
+        for i in range(4):
+            self.ping(self.subscriber, self.start + timedelta(hours=3, minutes=i * 10), self.pa)
+
+        stats = recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+
+        self.assertEqual(stats.subscribers, 1)
+        self.assertEqual(self.stored(self.subscriber), self.inferred(self.subscriber))
+        self.assertEqual([i.state_id for i in LocationInterval.objects.filter(
+            subscriber=self.subscriber)], ["NY", "PA"])
+        self.assertEqual(list(LocationInterval.objects.filter(subscriber=self.other)), untouched)
+        self.assertEqual(recompute_intervals(LocationInterval.Method.MAJORITY_VOTE).subscribers, 0)
+
+    def test_stored_timeline_freshness(self):
+        """Test that stored intervals are only served when they cover every ping"""
+        pings = self.subscriber.pings.all()
+        self.assertIsNone(stored_timeline(self.subscriber, LocationInterval.Method.MAJORITY_VOTE, pings))
+
+        recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+        intervals = stored_timeline(self.subscriber, LocationInterval.Method.MAJORITY_VOTE, pings)
+        self.assertEqual([i.state_id for i in intervals], ["NY"])
+
+        self.ping(self.subscriber, self.start + timedelta(hours=1), self.ny)
+        self.assertIsNone(stored_timeline(self.subscriber, LocationInterval.Method.MAJORITY_VOTE, pings))
+
+    def test_overlapping_intervals_rejected(self):
+        """Test the exclusion constraint on intervals of one subscriber and method"""
+        def interval(start, end, method=LocationInterval.Method.MAJORITY_VOTE):
+            return LocationInterval.objects.create(
+                subscriber=self.subscriber, interval_start=start, interval_end=end,
+                state=self.ny, confidence_pct=100, method=method,
+            )
+
+        interval(self.start, self.start + timedelta(hours=1))
+        # touching intervals and other methods are fine
+        interval(self.start + timedelta(hours=1), self.start + timedelta(hours=2))
+        interval(self.start, self.start + timedelta(hours=1), LocationInterval.Method.CLUSTERING)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            interval(self.start + timedelta(minutes=30), self.start + timedelta(minutes=90))
+
+    def test_recompute_intervals_command(self):
+        """Test the recompute_intervals management command"""
+        out = StringIO()
+        call_command("recompute_intervals", method=[LocationInterval.Method.MAJORITY_VOTE], stdout=out)
+
+        self.assertIn("for 2 subscribers", out.getvalue())
+        self.assertEqual(LocationInterval.objects.count(), 2)
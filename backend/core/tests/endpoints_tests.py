@@ -1,11 +1,22 @@
+import gzip
+import json
+from unittest import mock
+
+import msgpack
+import pyarrow.ipc as ipc
 from django.contrib.gis.geos import Point, MultiPolygon, Polygon
+from django.db import transaction
+from django.test import override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from datetime import timedelta
 
+from core.algorithms import recompute_intervals
+from core.ingestion import IngestQueue, assign_states
 from core.models import State, Subscriber, SubscriberPing, LocationInterval
+from core.serializers import StateSerializer
 
 class APITests(APITestCase):
     """Test cases for API endpoints"""
@@ -44,8 +55,56 @@ class APITests(APITestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], 'Test User')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Test User')
+        self.assertIsNone(response.data['next'])
+
+    def test_subscribers_keyset_pages(self):
+        """Test that subscribers are paged by id with a cursor"""
+        for i in range(4):
+            Subscriber.objects.create(name=f"User {i}")
+        url = reverse('subscriber-list')
+
+        seen, response = [], self.client.get(url, {'page_size': 2})
+        while True:
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [subscriber['id'] for subscriber in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(seen, sorted(Subscriber.objects.values_list('id', flat=True)))
+
+    @override_settings(PAGINATION={'PAGE_SIZE': 100, 'MAX_PAGE_SIZE': 1000,
+                                   'PING_PAGE_SIZE': 2, 'PING_MAX_PAGE_SIZE': 2})
+    def test_subscriber_pings_keyset_pages(self):
+        """Test that pings are paged latest first on (utc_time, ping_id)"""
+        # a tie on utc_time must neither repeat nor skip a ping across pages
+        SubscriberPing.objects.create(
+            subscriber=self.subscriber,
+            utc_time=self.pings[1].utc_time,
+            cell_type=SubscriberPing.CellType.SMS,
+            geom=Point(0.5, 0.5),
+            state=self.state,
+        )
+        url = reverse('subscriber-ping-list')
+
+        seen, response = [], self.client.get(url, {'page_size': 50})
+        while True:
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [ping['ping_id'] for ping in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+
+        expected = SubscriberPing.objects.order_by('-utc_time', '-ping_id').values_list('ping_id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_subscriber_pings_invalid_list_cursor(self):
+        """Test that a malformed list cursor answers 404"""
+        response = self.client.get(reverse('subscriber-ping-list'), {'cursor': 'bm90fGF8a2V5'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         
     def test_get_subscriber_detail(self):
         """Test GET /api/subscribers/{id}/"""
@@ -66,7 +125,9 @@ class APITests(APITestCase):
         self.assertIn('ping_count', response.data)
         self.assertIn('confidence_pct', response.data)
         self.assertIn('method', response.data)
-        self.assertIn('pings', response.data)
+        self.assertNotIn('pings', response.data)
+        self.assertEqual(len(response.data['intervals']), 1)
+        self.assertEqual(response.data['intervals'][0]['ping_count'], 3)
         
     def test_subscriber_infer_with_time_filter(self):
         """Test subscriber inference with time filtering"""
@@ -79,12 +140,241 @@ class APITests(APITestCase):
         response = self.client.get(url, {
             'model_id': LocationInterval.Method.MAJORITY_VOTE,
             'start': start_time.isoformat(),
-            'end': end_time.isoformat()
+            'end': end_time.isoformat(),
+            'include_pings': 'page',
         })
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['pings']), 3)
+
+    def test_subscriber_infer_ping_sample(self):
+        """Test that include_pings=sample spreads at most ping_limit flat pings"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+        response = self.client.get(url, {'include_pings': 'sample', 'ping_limit': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['ping_id'] for p in response.data['pings']],
+                         [self.pings[0].ping_id, self.pings[2].ping_id])
+        ping = response.data['pings'][0]
+        self.assertEqual(set(ping), {'ping_id', 'utc_time', 'cell_type', 'state', 'lon', 'lat'})
+        self.assertAlmostEqual(ping['lon'], -74.0)
+        self.assertAlmostEqual(ping['lat'], 40.7)
+        self.assertEqual(ping['state'], 'NY')
+
+    def test_subscriber_infer_ping_pages(self):
+        """Test that include_pings=page links to the following keyset pages"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+        response = self.client.get(url, {'include_pings': 'page', 'ping_limit': 2})
+
+        self.assertEqual(len(response.data['pings']), 2)
+        following = self.client.get(response.data['pings_next'])
+
+        self.assertEqual(following.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['ping_id'] for p in response.data['pings'] + following.data['results']],
+                         [p.ping_id for p in self.pings])
+        self.assertIsNone(following.data['next'])
+
+    def test_subscriber_infer_ping_cursor(self):
+        """Test that include_pings=cursor only returns the URL of the first page"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+        response = self.client.get(url, {'include_pings': 'cursor'})
+
+        self.assertNotIn('pings', response.data)
+        first = self.client.get(response.data['pings_next'])
+        self.assertEqual(len(first.data['results']), 3)
+
+    def test_subscriber_infer_invalid_include_pings(self):
+        """Test that unknown include_pings and ping_limit values are rejected"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+
+        self.assertEqual(self.client.get(url, {'include_pings': 'all'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'include_pings': 'page', 'ping_limit': 0}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_subscriber_pings_invalid_cursor(self):
+        """Test that a malformed ping cursor answers 404"""
+        url = reverse('subscriber-pings', kwargs={'pk': self.subscriber.id})
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         
+    def test_subscriber_infer_from_stored_intervals(self):
+        """Test that inference is served from up-to-date stored intervals"""
+        recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+        LocationInterval.objects.filter(subscriber=self.subscriber).update(confidence_pct=42)
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+
+        response = self.client.get(url, {'model_id': LocationInterval.Method.MAJORITY_VOTE})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(float(response.data['intervals'][0]['confidence_pct']), 42)
+
+    def test_subscriber_infer_filtered_ignores_stored_intervals(self):
+        """Test that a start filter is inferred over the matching pings only"""
+        recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+        LocationInterval.objects.filter(subscriber=self.subscriber).update(confidence_pct=42)
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+
+        response = self.client.get(url, {'model_id': LocationInterval.Method.MAJORITY_VOTE,
+                                         'start': self.pings[1].utc_time.isoformat()})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['intervals'][0]['ping_count'], 2)
+        self.assertNotEqual(float(response.data['intervals'][0]['confidence_pct']), 42)
+
+    def test_subscriber_infer_after_states_change(self):
+        """Test that reassigning states makes stored intervals stale"""
+        recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+        LocationInterval.objects.filter(subscriber=self.subscriber).update(confidence_pct=42)
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+
+        assign_states(reset_states=['NY'])
+        response = self.client.get(url, {'model_id': LocationInterval.Method.MAJORITY_VOTE})
+
+        self.assertNotEqual([float(i['confidence_pct']) for i in response.data['intervals']], [42])
+        recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+        self.assertFalse(LocationInterval.objects.filter(confidence_pct=42).exists())
+
+    def test_subscriber_infer_cached(self):
+        """Test that repeated inferences are cached until a ping is written"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+        params = {'model_id': LocationInterval.Method.CLUSTERING.value}
+        before = self.client.get(reverse('subscriber-infer-cache')).data
+
+        first = self.client.get(url, params)
+        second = self.client.get(url, params)
+        other_model = self.client.get(url, {'model_id': LocationInterval.Method.MAJORITY_VOTE})
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(other_model['X-Cache'], 'MISS')
+        self.assertEqual(second.data, first.data)
+
+        bulk = [{'subscriber': self.subscriber.id, 'utc_time': '2024-11-26T00:00:00',
+                 'cell_type': 'data', 'longitude': 0.5, 'latitude': 0.5}]
+        self.client.post(reverse('subscriber-ping-bulk'), bulk, format='json')
+        third = self.client.get(url, params)
+
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data['ping_count'], 4)
+        stats = self.client.get(reverse('subscriber-infer-cache')).data
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+        self.assertEqual(stats['misses'] - before['misses'], 3)
+
+    def test_subscriber_infer_cache_follows_database_version(self):
+        """Test that set-based ping updates move the subscriber's cache version"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        assign_states(reset_states=['NY'])
+
+        self.subscriber.refresh_from_db()
+        self.assertGreater(self.subscriber.pings_version, 0)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    @override_settings(INFERENCE_CACHE={'ENABLED': False})
+    def test_subscriber_infer_cache_disabled(self):
+        """Test that the inference cache can be switched off"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+
+        self.client.get(url)
+        response = self.client.get(url)
+
+        self.assertEqual(response['X-Cache'], 'BYPASS')
+
+    def test_export_pings_ndjson(self):
+        """Test that a subscriber's pings stream as NDJSON in time order"""
+        url = reverse('subscriber-export-pings', kwargs={'pk': self.subscriber.id, 'export_format': 'ndjson'})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['ping_id'] for row in rows], [p.ping_id for p in self.pings])
+        self.assertEqual(rows[0]['state'], 'NY')
+        self.assertAlmostEqual(rows[0]['lon'], -74.0)
+
+    def test_export_pings_csv_chunks(self):
+        """Test that the CSV export is written one chunk at a time"""
+        url = reverse('subscriber-export-pings', kwargs={'pk': self.subscriber.id, 'export_format': 'csv'})
+        with mock.patch('core.exports.EXPORT_CHUNK', 2):
+            response = self.client.get(url)
+            chunks = list(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(chunks[0], b'ping_id,utc_time,cell_type,state,lon,lat\r\n')
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks[1:]], [2, 1])
+
+    def test_export_reads_inside_transaction(self):
+        """Test that the export cursor is opened in a transaction held while streaming"""
+        url = reverse('subscriber-export-pings', kwargs={'pk': self.subscriber.id, 'export_format': 'csv'})
+        with mock.patch('core.exports.transaction.atomic', wraps=transaction.atomic) as atomic:
+            response = self.client.get(url)
+            atomic.assert_not_called()
+            body = b''.join(response.streaming_content)
+
+        atomic.assert_called_with(using='default')
+        self.assertEqual(body.count(b'\n'), 4)
+
+    def test_export_intervals(self):
+        """Test that inferred and stored intervals stream the same timeline"""
+        url = reverse('subscriber-export-intervals', kwargs={'pk': self.subscriber.id, 'export_format': 'ndjson'})
+        params = {'model_id': LocationInterval.Method.MAJORITY_VOTE}
+
+        inferred = b''.join(self.client.get(url, params).streaming_content)
+        recompute_intervals(LocationInterval.Method.MAJORITY_VOTE)
+        stored = b''.join(self.client.get(url, params).streaming_content)
+
+        rows = [json.loads(line) for line in inferred.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['ping_count'], 3)
+        self.assertEqual(rows[0]['state'], 'NY')
+        self.assertEqual(stored, inferred)
+
+    def test_subscriber_pings_msgpack(self):
+        """Test that ping pages negotiate MessagePack"""
+        url = reverse('subscriber-pings', kwargs={'pk': self.subscriber.id})
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        page = msgpack.unpackb(response.content)
+        self.assertEqual([p['ping_id'] for p in page['results']], [p.ping_id for p in self.pings])
+        self.assertIsNone(page['next'])
+
+    def test_subscriber_pings_arrow(self):
+        """Test that ping pages render as one columnar Arrow IPC stream"""
+        url = reverse('subscriber-pings', kwargs={'pk': self.subscriber.id})
+        response = self.client.get(url, {'format': 'arrow', 'page_size': 2})
+
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column_names, ['ping_id', 'utc_time', 'cell_type', 'state', 'lon', 'lat'])
+        self.assertEqual(table.column('ping_id').to_pylist(), [p.ping_id for p in self.pings[:2]])
+        self.assertEqual(table.column('utc_time').to_pylist(), [p.utc_time for p in self.pings[:2]])
+        self.assertIn(b'cursor=', table.schema.metadata[b'next'])
+
+    def test_subscriber_infer_arrow(self):
+        """Test that an inference renders its intervals as the Arrow table"""
+        url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
+        response = self.client.get(url, {'format': 'arrow'})
+
+        table = ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column('ping_count').to_pylist(), [3])
+        self.assertEqual(json.loads(table.schema.metadata[b'ping_count']), 3)
+
+    def test_json_responses_gzipped(self):
+        """Test that JSON responses are compressed for clients accepting gzip"""
+        url = reverse('subscriber-pings', kwargs={'pk': self.subscriber.id})
+        plain = self.client.get(url)
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), json.loads(plain.content))
+
     def test_subscriber_infer_with_clustering(self):
         """Test subscriber inference with clustering algorithm"""
         url = reverse('subscriber-infer', kwargs={'pk': self.subscriber.id})
@@ -119,6 +409,8 @@ class APITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['name'], 'New York')
+        state = State.objects.get(state_code=response.data[0]['state_code'])
+        self.assertEqual(response.data[0]['geom'], StateSerializer(state).data['geom'])
         
     def test_subscriber_name_filter(self):
         """Test filtering subscribers by name"""
@@ -129,6 +421,126 @@ class APITests(APITestCase):
         response = self.client.get(url, {'name': 'Test'})
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], 'Test User')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Test User')
+
+    def test_create_ping_resolves_state(self):
+        """Test POST /api/subscriber-pings/ without a state"""
+        url = reverse('subscriber-ping-list')
+        response = self.client.post(url, {
+            'subscriber': self.subscriber.id,
+            'utc_time': '2024-11-26T00:00:00',
+            'cell_type': SubscriberPing.CellType.DATA,
+            'geom': 'POINT (0.5 0.5)',
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['state'], 'NY')
+
+
+    def test_create_ping_is_idempotent(self):
+        """Test that replaying POST /api/subscriber-pings/ does not duplicate"""
+        url = reverse('subscriber-ping-list')
+        payload = {
+            'subscriber': self.subscriber.id,
+            'utc_time': '2024-11-26T00:00:00',
+            'cell_type': SubscriberPing.CellType.SMS,
+            'geom': 'POINT (0.25 0.75)',
+        }
+
+        first = self.client.post(url, payload, format='json')
+        second = self.client.post(url, payload, format='json')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['ping_id'], second.data['ping_id'])
+        self.assertEqual(SubscriberPing.objects.filter(cell_type=SubscriberPing.CellType.SMS).count(), 1)
+
+    def test_create_ping_without_subscriber_is_idempotent(self):
+        """Test that replaying a ping without a subscriber does not duplicate"""
+        url = reverse('subscriber-ping-list')
+        payload = {
+            'utc_time': '2024-11-26T00:00:00',
+            'cell_type': SubscriberPing.CellType.DATA,
+            'geom': 'POINT (0.25 0.75)',
+        }
+
+        first = self.client.post(url, payload, format='json')
+        second = self.client.post(url, payload, format='json')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['ping_id'], second.data['ping_id'])
+        self.assertEqual(SubscriberPing.objects.filter(subscriber__isnull=True).count(), 1)
+
+    def test_bulk_ingest_ndjson(self):
+        """Test POST /api/subscriber-pings/bulk/ with an NDJSON body"""
+        url = reverse('subscriber-ping-bulk')
+        lines = [
+            {'subscriber': self.subscriber.id, 'utc_time': '2024-11-26T00:00:00Z',
+             'cell_type': 'data', 'longitude': 0.5, 'latitude': 0.5},
+            {'subscriber': self.subscriber.id, 'utc_time': '2024-11-26T00:05:00',
+             'cell_type': 'sms', 'longitude': 50.0, 'latitude': 50.0},
+            {'subscriber': self.subscriber.id, 'utc_time': '2024-11-26T00:10:00',
+             'cell_type': 'fax', 'longitude': 0.5, 'latitude': 0.5},
+            {'subscriber': 999999, 'utc_time': '2024-11-26T00:15:00',
+             'cell_type': 'data', 'longitude': 0.5, 'latitude': 0.5},
+        ]
+        body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        replay = self.client.post(url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['inserted'], 2)
+        self.assertEqual(response.data['rejected'], 3)
+        self.assertEqual(sorted(e['line'] for e in response.data['errors']), [3, 4, 5])
+        self.assertEqual(replay.data['inserted'], 0)
+        self.assertEqual(replay.data['duplicates'], 2)
+        ping = SubscriberPing.objects.get(cell_type='data', utc_time__year=2024)
+        self.assertEqual(ping.state_id, 'NY')
+        self.assertIsNone(SubscriberPing.objects.get(cell_type='sms').state_id)
+
+    def test_bulk_ingest_json_array(self):
+        """Test POST /api/subscriber-pings/bulk/ with a JSON array body"""
+        url = reverse('subscriber-ping-bulk')
+        records = [
+            {'subscriber': self.subscriber.id, 'utc_time': f'2024-11-26T00:0{i}:00',
+             'cell_type': 'voice', 'longitude': 0.1 * i, 'latitude': 0.1}
+            for i in range(1, 4)
+        ]
+
+        response = self.client.post(url, records, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['inserted'], 3)
+        self.assertEqual(response.data['rejected'], 0)
+        self.assertEqual(self.subscriber.pings.count(), 6)
+
+    def test_create_ping_queued(self):
+        """Test POST /api/subscriber-pings/ through the ingest queue"""
+        url = reverse('subscriber-ping-list')
+        payload = {
+            'subscriber': self.subscriber.id,
+            'utc_time': '2024-11-26T00:00:00',
+            'cell_type': SubscriberPing.CellType.DATA,
+            'geom': 'POINT (0.5 0.5)',
+        }
+        queue = IngestQueue(max_size=1, workers=0)
+        enabled = {'ENABLED': True}
+
+        with override_settings(INGEST_QUEUE=enabled), \
+                mock.patch('core.views.get_ingest_queue', return_value=queue):
+            accepted = self.client.post(url, payload, format='json')
+            refused = self.client.post(url, payload, format='json')
+            stats = self.client.get(reverse('subscriber-ping-queue'))
+
+        self.assertEqual(accepted.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(refused.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(stats.data['depth'], 1)
+        self.assertEqual(stats.data['rejected'], 1)
 
+        queue.flush_once()
+        ping = SubscriberPing.objects.get(cell_type=SubscriberPing.CellType.DATA)
+        self.assertEqual(ping.state_id, 'NY')
@@ -152,15 +152,17 @@ SAMPLE_API_RESPONSES = {
                 "ping_id": 1,
                 "utc_time": "2024-11-26T00:00:00Z",
                 "cell_type": "voice",
-                "geom": "SRID=4326;POINT (-74.0059 40.7128)",
-                "state": "NY"
+                "state": "NY",
+                "lon": -74.0059,
+                "lat": 40.7128
             },
             {
                 "ping_id": 2,
                 "utc_time": "2024-11-26T01:00:00Z",
                 "cell_type": "voice",
-                "geom": "SRID=4326;POINT (-73.9442 40.8176)",
-                "state": "NY"
+                "state": "NY",
+                "lon": -73.9442,
+                "lat": 40.8176
             }
         ]
     }
@@ -0,0 +1,579 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.test import TestCase, TransactionTestCase
+
+from core.ingestion import (
+    IngestQueue,
+    QueueFull,
+    StateLocator,
+    assign_states,
+    get_state_locator,
+    import_columnar,
+    import_csv,
+)
+from core.ingestion.loader import PingCopyLoader
+from core.ingestion.parallel import group_tasks, import_files, import_subscriber_files, read_tasks
+from core.ingestion.sources import file_fingerprint
+from core.models import ImportCheckpoint, State, Subscriber, SubscriberPing
+
+
+CSV_HEADER = "UTCDateTime,Longitude,Latitude,CellType\n"
+
+
+class ImportDataCommandTests(TestCase):
+    """Test cases for the bulk CSV importer"""
+
+    def setUp(self):
+        self.state = State.objects.create(
+            state_code="NY",
+            name="New York",
+            geom=MultiPolygon(Polygon(((-75, 40), (-75, 41), (-73, 41), (-73, 40), (-75, 40)))),
+        )
+
+    def write_csv(self, rows):
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as f:
+            f.write(CSV_HEADER)
+            f.writelines(rows)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_resolves_states(self):
+        """Test that pings are bulk loaded with their containing state"""
+        path = self.write_csv([
+            "11/26/24 00:00,-74.0,40.7,Voice\n",
+            "11/26/24 00:05,-74.1,40.8,SMS\n",
+            "11/26/24 00:10,-100.0,30.0,Data\n",
+        ])
+        out = StringIO()
+        call_command("import_data", "Loader User", path, batch_size=2, stdout=out)
+
+        subscriber = Subscriber.objects.get(name="Loader User")
+        pings = SubscriberPing.objects.filter(subscriber=subscriber).order_by("utc_time")
+        self.assertEqual(pings.count(), 3)
+        self.assertEqual([p.state_id for p in pings], ["NY", "NY", None])
+        self.assertAlmostEqual(pings[0].geom.x, -74.0)
+        self.assertIn("Imported 3 pings", out.getvalue())
+
+    def test_import_reports_parse_errors(self):
+        """Test that malformed rows are reported and skipped"""
+        path = self.write_csv([
+            "11/26/24 00:00,-74.0,40.7,Voice\n",
+            "not a date,-74.0,40.7,Voice\n",
+            "11/26/24 00:10,oops,40.7,Voice\n",
+        ])
+        out, err = StringIO(), StringIO()
+        call_command("import_data", "Broken User", path, stdout=out, stderr=err)
+
+        self.assertEqual(SubscriberPing.objects.count(), 1)
+        self.assertIn("line 3", err.getvalue())
+        self.assertIn("line 4", err.getvalue())
+        self.assertIn("2 rows rejected", out.getvalue())
+
+    def test_import_reports_undecodable_rows(self):
+        """Test that a line that is not UTF-8 is reported and skipped"""
+        path = self.write_csv(["11/26/24 00:00,-74.0,40.7,Voice\n"])
+        with open(path, "ab") as f:
+            f.write(b"11/26/24 00:05,-74.0,40.7,Vo\xffice\n")
+            f.write(b"11/26/24 00:10,-74.0,40.7,SMS\n")
+        out, err = StringIO(), StringIO()
+        call_command("import_data", "Undecodable User", path, stdout=out, stderr=err)
+
+        self.assertEqual(SubscriberPing.objects.count(), 2)
+        self.assertIn("line 3", err.getvalue())
+        self.assertIn("1 rows rejected", out.getvalue())
+
+    def test_import_skips_duplicate_rows(self):
+        """Test that rows already stored under the natural key are skipped"""
+        path = self.write_csv([
+            "11/26/24 00:00,-74.0,40.7,Voice\n",
+            "11/26/24 00:00,-74.0,40.7,Voice\n",
+            "11/26/24 00:05,-74.0,40.7,Voice\n",
+        ])
+        out = StringIO()
+        call_command("import_data", "Duplicated User", path, batch_size=2, stdout=out)
+
+        self.assertEqual(SubscriberPing.objects.count(), 2)
+        self.assertIn("1 duplicates skipped", out.getvalue())
+
+    def test_load_keeps_sub_second_times(self):
+        """Test that pings a fraction of a second apart are not duplicates"""
+        subscriber = Subscriber.objects.create(name="Fast User")
+        base = datetime(2024, 11, 26, 0, 0)
+        rows = [(base + timedelta(milliseconds=250 * i), "Data", -74.0, 40.7) for i in range(3)]
+
+        stats = PingCopyLoader().load(subscriber.id, rows)
+
+        self.assertEqual(stats.inserted, 3)
+        self.assertEqual(
+            list(subscriber.pings.order_by("utc_time").values_list("utc_time", flat=True)),
+            [row[0] for row in rows],
+        )
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test that a crashed import resumes after the last committed chunk"""
+        path = self.write_csv([
+            f"11/26/24 00:{minute:02d},-74.0,40.7,Voice\n" for minute in range(5)
+        ])
+        write = PingCopyLoader.write
+        calls = []
+
+        def crash_on_second_chunk(loader, subscriber_id, frame):
+            calls.append(len(frame))
+            if len(calls) == 2:
+                raise RuntimeError("connection lost")
+            return write(loader, subscriber_id, frame)
+
+        with mock.patch.object(PingCopyLoader, "write", crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                import_csv("Resumed User", path, batch_size=2)
+
+        checkpoint = ImportCheckpoint.objects.get(subscriber__name="Resumed User")
+        self.assertEqual(checkpoint.rows_done, 2)
+        self.assertFalse(checkpoint.completed)
+        self.assertEqual(SubscriberPing.objects.count(), 2)
+
+        stats = import_csv("Resumed User", path, batch_size=2)
+
+        self.assertEqual(stats.resumed_rows, 2)
+        self.assertEqual(stats.inserted, 3)
+        self.assertEqual(SubscriberPing.objects.count(), 5)
+        checkpoint.refresh_from_db()
+        self.assertTrue(checkpoint.completed)
+        self.assertIsNone(import_csv("Resumed User", path, batch_size=2))
+
+    def test_import_refuses_changed_file(self):
+        """Test that a checkpoint does not resume a rewritten file"""
+        path = self.write_csv(["11/26/24 00:00,-74.0,40.7,Voice\n"] * 3)
+        subscriber = Subscriber.objects.create(name="Changed User")
+        with open(path, "rb") as f:
+            data = f.read()
+        ImportCheckpoint.objects.create(
+            subscriber=subscriber,
+            source=path,
+            fingerprint=file_fingerprint(path),
+            byte_offset=len(data),
+            chunk_offset=len(CSV_HEADER),
+            chunk_hash="0" * 64,
+            rows_done=3,
+        )
+
+        with self.assertRaises(CommandError):
+            call_command("import_data", "Changed User", path, stdout=StringIO())
+
+    def test_import_picks_up_appended_rows(self):
+        """Test that rows appended to an imported file are loaded by a rerun"""
+        path = self.write_csv([
+            f"11/26/24 00:{minute:02d},-74.0,40.7,Voice\n" for minute in range(3)
+        ])
+        import_csv("Appended User", path, batch_size=2)
+        with open(path, "a") as f:
+            f.writelines(f"11/26/24 00:{minute:02d},-74.0,40.7,Voice\n" for minute in range(3, 5))
+
+        stats = import_csv("Appended User", path, batch_size=2)
+
+        self.assertEqual(stats.resumed_rows, 3)
+        self.assertEqual(stats.inserted, 2)
+        self.assertEqual(SubscriberPing.objects.filter(subscriber__name="Appended User").count(), 5)
+        self.assertTrue(ImportCheckpoint.objects.get(subscriber__name="Appended User").completed)
+        self.assertIsNone(import_csv("Appended User", path, batch_size=2))
+
+    def test_import_new_file_for_existing_subscriber(self):
+        """Test that pings loaded without checkpoints do not block new files"""
+        subscriber = Subscriber.objects.create(name="Existing User")
+        PingCopyLoader().load(subscriber.id, [(datetime(2024, 11, 25), "Data", -74.0, 40.7)])
+        path = self.write_csv(["11/26/24 00:00,-74.0,40.7,Voice\n"])
+
+        stats = import_csv("Existing User", path)
+
+        self.assertEqual(stats.inserted, 1)
+        self.assertEqual(subscriber.pings.count(), 2)
+
+
+    def write_table(self, table, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        if suffix == ".parquet":
+            pq.write_table(table, path, row_group_size=2)
+        else:
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_parquet(self):
+        """Test that Parquet files are loaded in record batches"""
+        table = pa.table({
+            "UTCDateTime": pa.array(
+                [datetime(2024, 11, 26, 0, minute) for minute in range(3)],
+                pa.timestamp("us", tz="UTC"),
+            ),
+            "Longitude": [-74.0, None, -100.0],
+            "Latitude": [40.7, 40.8, 30.0],
+            "CellType": ["Voice", "SMS", "Data"],
+        })
+        path = self.write_table(table, ".parquet")
+        out, err = StringIO(), StringIO()
+        call_command("import_data", "Parquet User", path, batch_size=2, stdout=out, stderr=err)
+
+        pings = SubscriberPing.objects.filter(subscriber__name="Parquet User").order_by("utc_time")
+        self.assertEqual([p.state_id for p in pings], ["NY", None])
+        self.assertEqual(pings[0].utc_time, datetime(2024, 11, 26, 0, 0))
+        self.assertIn("line 2", err.getvalue())
+        self.assertIn("Imported 2 pings", out.getvalue())
+
+    def test_import_arrow_resumes_from_checkpoint(self):
+        """Test that an Arrow import skips the rows already committed"""
+        table = pa.table({
+            "utc_time": [f"11/26/24 00:{minute:02d}" for minute in range(5)],
+            "cell_type": ["Voice"] * 5,
+            "longitude": [-74.0] * 5,
+            "latitude": [40.7] * 5,
+        })
+        path = self.write_table(table, ".arrow")
+        subscriber = Subscriber.objects.create(name="Arrow User")
+        ImportCheckpoint.objects.create(
+            subscriber=subscriber, source=path,
+            fingerprint=file_fingerprint(path), rows_done=3,
+        )
+
+        stats = import_columnar("Arrow User", path, batch_size=2)
+
+        self.assertEqual(stats.resumed_rows, 3)
+        self.assertEqual(stats.inserted, 2)
+        self.assertEqual(
+            sorted(p.utc_time.minute for p in subscriber.pings.all()), [3, 4]
+        )
+
+
+class DedupePingsTests(TestCase):
+    """Test cases for removing pings that duplicate the natural key"""
+
+    def setUp(self):
+        # simulate a table filled before the natural key constraint existed
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "ALTER TABLE core_subscriberping DROP CONSTRAINT core_ping_natural_key"
+            )
+        self.subscriber = Subscriber.objects.create(name="Doubled User")
+        self.base = datetime(2024, 11, 26)
+        for copy in range(3):
+            for i in range(2):
+                SubscriberPing.objects.create(
+                    subscriber=self.subscriber,
+                    utc_time=self.base + timedelta(minutes=i),
+                    cell_type=SubscriberPing.CellType.CALL,
+                    geom=Point(-74.0, 40.7),
+                )
+
+    def test_dry_run_only_counts(self):
+        """Test that --dry-run reports without deleting"""
+        out = StringIO()
+        call_command("dedupe_pings", dry_run=True, stdout=out)
+
+        self.assertIn("Found 4 duplicate pings", out.getvalue())
+        self.assertEqual(SubscriberPing.objects.count(), 6)
+
+    def test_keeps_oldest_copy(self):
+        """Test that only the lowest ping_id of every key survives"""
+        first_ids = sorted(SubscriberPing.objects.values_list("ping_id", flat=True))[:2]
+
+        call_command("dedupe_pings", chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(SubscriberPing.objects.values_list("ping_id", flat=True)), first_ids
+        )
+
+    def test_removes_copies_without_subscriber(self):
+        """Test that pings without a subscriber are deduplicated too"""
+        for copy in range(2):
+            SubscriberPing.objects.create(
+                utc_time=self.base,
+                cell_type=SubscriberPing.CellType.DATA,
+                geom=Point(-74.0, 40.7),
+            )
+
+        call_command("dedupe_pings", stdout=StringIO())
+
+        self.assertEqual(SubscriberPing.objects.filter(subscriber__isnull=True).count(), 1)
+        self.assertEqual(SubscriberPing.objects.count(), 3)
+
+
+class ReadTasksTests(TestCase):
+    """Test cases for building the parallel import task list"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for name in ("bob", "alice"):
+            with open(os.path.join(self.directory.name, f"{name}.csv"), "w") as f:
+                f.write(CSV_HEADER)
+
+    def test_tasks_from_directory(self):
+        """Test that every CSV of a directory becomes one task"""
+        tasks = read_tasks(self.directory.name)
+
+        self.assertEqual([name for name, _ in tasks], ["alice", "bob"])
+        self.assertTrue(all(path.endswith(".csv") for _, path in tasks))
+
+    def test_tasks_from_manifest(self):
+        """Test that manifest paths are resolved against its directory"""
+        manifest = os.path.join(self.directory.name, "manifest.txt")
+        with open(manifest, "w") as f:
+            f.write("subscriber,path\nJonnison,bob.csv\nNishant,bob.csv\n")
+
+        tasks = read_tasks(manifest)
+
+        self.assertEqual(tasks, [
+            ("Jonnison", os.path.join(self.directory.name, "bob.csv")),
+            ("Nishant", os.path.join(self.directory.name, "bob.csv")),
+        ])
+
+    def test_groups_files_by_subscriber(self):
+        """Test that every subscriber's files are dispatched together, in order"""
+        tasks = [("Jonnison", "a.csv"), ("Nishant", "b.csv"), ("Jonnison", "c.csv")]
+
+        self.assertEqual(group_tasks(tasks), [
+            ("Jonnison", ["a.csv", "c.csv"]),
+            ("Nishant", ["b.csv"]),
+        ])
+
+    def test_two_files_for_one_subscriber(self):
+        """Test that a subscriber's files are imported under a single subscriber"""
+        paths = []
+        for i, minute in enumerate((0, 5)):
+            path = os.path.join(self.directory.name, f"part{i}.csv")
+            with open(path, "w") as f:
+                f.write(CSV_HEADER + f"11/26/24 00:{minute:02d},-74.0,40.7,Voice\n")
+            paths.append(path)
+
+        results = import_subscriber_files("Jonnison", paths)
+
+        self.assertEqual([result.error for result in results], [None, None])
+        self.assertEqual(Subscriber.objects.filter(name="Jonnison").count(), 1)
+        self.assertEqual(SubscriberPing.objects.filter(subscriber__name="Jonnison").count(), 2)
+
+
+class ParallelImportTests(TransactionTestCase):
+    """Test cases for imports fanned out over spawned worker processes"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_csv(self, name, minute):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as f:
+            f.write(CSV_HEADER + f"11/26/24 00:{minute:02d},-74.0,40.7,Voice\n")
+        return path
+
+    def test_import_files_on_worker_pool(self):
+        """Test that spawned workers import every file, one subscriber each"""
+        tasks = [
+            ("Jonnison", self.write_csv("a.csv", 0)),
+            ("Nishant", self.write_csv("b.csv", 0)),
+            ("Jonnison", self.write_csv("c.csv", 5)),
+        ]
+
+        results = list(import_files(tasks, workers=2, batch_size=10))
+
+        self.assertEqual([result.error for result in results], [None] * 3)
+        self.assertEqual(sorted(result.path for result in results), sorted(path for _, path in tasks))
+        self.assertEqual(Subscriber.objects.filter(name="Jonnison").count(), 1)
+        self.assertEqual(SubscriberPing.objects.filter(subscriber__name="Jonnison").count(), 2)
+        self.assertEqual(SubscriberPing.objects.filter(subscriber__name="Nishant").count(), 1)
+
+
+class AssignStatesTests(TestCase):
+    """Test cases for the set-based state assignment stage"""
+
+    def setUp(self):
+        self.ny = State.objects.create(
+            state_code="NY",
+            name="New York",
+            geom=MultiPolygon(Polygon(((-75, 40), (-75, 41), (-73, 41), (-73, 40), (-75, 40)))),
+        )
+        self.nj = State.objects.create(
+            state_code="NJ",
+            name="New Jersey",
+            geom=MultiPolygon(Polygon(((-76, 39), (-76, 40), (-74, 40), (-74, 39), (-76, 39)))),
+        )
+        self.subscriber = Subscriber.objects.create(name="Unassigned User")
+        self.other = Subscriber.objects.create(name="Other User")
+        self.base = datetime(2024, 11, 26)
+        coords = [(-74.5, 40.5), (-75.5, 39.5), (-74.5, 39.5), (-10.0, 10.0)]
+        for subscriber in (self.subscriber, self.other):
+            for i, (lng, lat) in enumerate(coords):
+                SubscriberPing.objects.create(
+                    subscriber=subscriber,
+                    utc_time=self.base + timedelta(minutes=i),
+                    cell_type=SubscriberPing.CellType.DATA,
+                    geom=Point(lng, lat),
+                )
+
+    def states_of(self, subscriber):
+        return list(
+            SubscriberPing.objects.filter(subscriber=subscriber)
+            .order_by("utc_time")
+            .values_list("state_id", flat=True)
+        )
+
+    def test_assign_states_for_subscriber(self):
+        """Test that only the requested subscriber is resolved"""
+        assigned = assign_states(subscriber_ids=[self.subscriber.id], chunk_size=2)
+
+        self.assertEqual(assigned, 3)
+        self.assertEqual(self.states_of(self.subscriber), ["NY", "NJ", "NJ", None])
+        self.assertEqual(self.states_of(self.other), [None] * 4)
+
+    def test_assign_states_time_range(self):
+        """Test restricting the stage to a time range"""
+        assign_states(start=self.base + timedelta(minutes=1), end=self.base + timedelta(minutes=2))
+
+        self.assertEqual(self.states_of(self.subscriber), [None, "NJ", None, None])
+
+    def test_reset_states_after_boundary_change(self):
+        """Test re-resolving the pings of a state whose boundary moved"""
+        assign_states()
+        self.nj.geom = MultiPolygon(Polygon(((-76, 39), (-76, 40), (-75, 40), (-75, 39), (-76, 39))))
+        self.nj.save()
+
+        assign_states(reset_states=["NJ"])
+
+        self.assertEqual(self.states_of(self.subscriber), ["NY", "NJ", None, None])
+
+    def test_assign_states_command(self):
+        """Test the assign_states management command"""
+        out = StringIO()
+        call_command("assign_states", subscriber=[self.other.id], stdout=out)
+
+        self.assertIn("Assigned a state to 3 pings", out.getvalue())
+        self.assertEqual(self.states_of(self.subscriber), [None] * 4)
+
+
+class StateLocatorTests(TestCase):
+    """Test cases for the in-memory point to state index"""
+
+    def setUp(self):
+        self.ny = State.objects.create(
+            state_code="NY",
+            name="New York",
+            geom=MultiPolygon(Polygon(((-75, 40), (-75, 41), (-73, 41), (-73, 40), (-75, 40)))),
+        )
+        State.objects.create(
+            state_code="NJ",
+            name="New Jersey",
+            geom=MultiPolygon(Polygon(((-76, 39), (-76, 40), (-74, 40), (-74, 39), (-76, 39)))),
+        )
+
+    def test_locate_vectorized(self):
+        """Test locating several points in one call"""
+        locator = StateLocator.from_db()
+        codes = locator.locate([-74.5, -75.5, -10.0], [40.5, 39.5, 10.0])
+
+        self.assertEqual(len(locator), 2)
+        self.assertEqual(list(codes), ["NY", "NJ", None])
+
+    def test_locate_matches_postgis(self):
+        """Test that the locator agrees with ST_Contains"""
+        locator = get_state_locator()
+        for lng, lat in [(-74.5, 40.5), (-75.5, 39.5), (-74.0, 40.0), (0.0, 0.0)]:
+            point = Point(lng, lat, srid=4326)
+            expected = State.objects.filter(geom__contains=point).values_list("state_code", flat=True).first()
+            self.assertEqual(locator.locate_one(lng, lat), expected)
+
+    def test_invalidated_on_state_change(self):
+        """Test that saving a state rebuilds the shared locator"""
+        locator = get_state_locator()
+        self.assertIs(get_state_locator(), locator)
+
+        self.ny.geom = MultiPolygon(Polygon(((-10, 5), (-10, 15), (0, 15), (0, 5), (-10, 5))))
+        self.ny.save()
+
+        self.assertIsNot(get_state_locator(), locator)
+        self.assertEqual(get_state_locator().locate_one(-5.0, 10.0), "NY")
+
+    def test_rebuilt_after_change_elsewhere(self):
+        """Test that a state changed without signals (another process) is picked up"""
+        locator = get_state_locator()
+        State.objects.filter(pk="NY").update(
+            geom=MultiPolygon(Polygon(((-10, 5), (-10, 15), (0, 15), (0, 5), (-10, 5))))
+        )
+
+        self.assertIs(get_state_locator(), locator)
+        with mock.patch("core.ingestion.locator.CHECK_INTERVAL", 0):
+            self.assertIsNot(get_state_locator(), locator)
+            self.assertEqual(get_state_locator().locate_one(-5.0, 10.0), "NY")
+
+
+class IngestQueueTests(TestCase):
+    """Test cases for the batched ingest queue"""
+
+    def setUp(self):
+        self.subscriber = Subscriber.objects.create(name="Queued User")
+        self.queue = IngestQueue(max_size=3, batch_size=2, workers=0)
+
+    def row(self, minute):
+        return (self.subscriber.id, datetime(2024, 11, 26, 0, minute),
+                SubscriberPing.CellType.DATA, -74.0, 40.7, None)
+
+    def test_flushes_in_batches(self):
+        """Test that queued pings are written batch_size at a time"""
+        for minute in range(3):
+            self.queue.put(self.row(minute))
+
+        self.assertEqual(self.queue.flush_once(), 2)
+        self.assertEqual(self.queue.flush_once(), 1)
+        self.assertEqual(self.queue.flush_once(), 0)
+
+        self.assertEqual(self.subscriber.pings.count(), 3)
+        stats = self.queue.stats()
+        self.assertEqual(stats["depth"], 0)
+        self.assertEqual(stats["batches"], 2)
+        self.assertEqual(stats["inserted"], 3)
+
+    def test_rejects_when_full(self):
+        """Test that the queue never grows past max_size"""
+        for minute in range(3):
+            self.queue.put(self.row(minute))
+
+        with self.assertRaises(QueueFull):
+            self.queue.put(self.row(3))
+        self.assertEqual(self.queue.stats()["rejected"], 1)
+        self.assertEqual(self.queue.depth, 3)
+
+    def test_writes_pings_without_subscriber(self):
+        """Test that a batch mixing missing and set subscribers is written"""
+        self.queue.put((None,) + self.row(0)[1:])
+        self.queue.put(self.row(1))
+
+        self.assertEqual(self.queue.flush_once(), 2)
+
+        self.assertEqual(SubscriberPing.objects.filter(subscriber__isnull=True).count(), 1)
+        self.assertEqual(self.subscriber.pings.count(), 1)
+        self.assertEqual(self.queue.stats()["dead_lettered"], 0)
+
+    def test_isolates_rejected_pings(self):
+        """Test that a rejected ping is dead-lettered without its batch"""
+        bad = (self.subscriber.id, datetime(2024, 11, 26, 0, 5), "Satellite", -74.0, 40.7, None)
+        self.queue.put(bad)
+        self.queue.put(self.row(1))
+
+        with self.assertLogs("core.ingestion.ingest_queue", "ERROR"):
+            self.assertEqual(self.queue.flush_once(), 2)
+
+        self.assertEqual(self.subscriber.pings.count(), 1)
+        self.assertEqual(list(self.queue.dead_letters), [bad])
+        stats = self.queue.stats()
+        self.assertEqual(stats["dead_lettered"], 1)
+        self.assertEqual(stats["written"], 1)
@@ -45,7 +45,7 @@ class IntegrationTests(TestCase):
             
             # Run inference
             pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
-            interval = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+            interval = algorithm.summarize(algorithm.infer_intervals(self.subscriber, pings=pings_queryset))
             
             # Verify results
             self.assertIsInstance(interval, LocationInterval)
@@ -65,8 +65,9 @@ class IntegrationTests(TestCase):
             
             # Run inference with empty queryset
             empty_pings = SubscriberPing.objects.filter(subscriber=empty_subscriber)
-            interval = algorithm.infer_intervals(empty_subscriber, pings=empty_pings)
+            intervals = algorithm.infer_intervals(empty_subscriber, pings=empty_pings)
             
             # Should handle empty case gracefully
-            self.assertIsNone(interval)
+            self.assertEqual(intervals, [])
+            self.assertIsNone(algorithm.summarize(intervals))
 
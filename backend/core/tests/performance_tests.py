@@ -1,3 +1,5 @@
+import logging
+
 from django.test import TestCase, override_settings
 from django.contrib.gis.geos import Point, MultiPolygon, Polygon
 from django.utils import timezone
@@ -5,6 +7,19 @@ from datetime import timedelta
 
 from core.models import State, Subscriber, SubscriberPing, LocationInterval
 from core.algorithms import LocationInferenceModel
+from core.algorithms.arrays import PingArrays
+from core.algorithms.majority_vote import MajorityVoteModel
+from core.algorithms.hmm import HMMModel
+from core.algorithms.clustering import ClusteringModel
+from core.algorithms.sql_clustering import SqlClusteringModel
+from core.serializers import (
+    FlatIntervalSerializer,
+    FlatSubscriberPingSerializer,
+    LocationIntervalSerializer,
+    SubscriberPingSerializer,
+)
+
+logger = logging.getLogger(__name__)
 
 @override_settings(DEBUG=True)
 class PerformanceTests(TestCase):
@@ -47,7 +62,7 @@ class PerformanceTests(TestCase):
             algorithm = LocationInferenceModel.get(method_id)
             
             start_time = time.time()
-            interval = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+            interval = algorithm.summarize(algorithm.infer_intervals(self.subscriber, pings=pings_queryset))
             end_time = time.time()
             
             execution_time = end_time - start_time
@@ -58,3 +73,149 @@ class PerformanceTests(TestCase):
             # Verify results
             self.assertEqual(interval.ping_count, 100)
             self.assertGreater(interval.confidence_pct, 0)
+
+    def test_majority_vote_year_of_pings(self):
+        """Test that a year of minute pings is voted in well under a second"""
+        import time
+        import numpy as np
+
+        minutes = 365 * 24 * 60
+        rng = np.random.default_rng(0)
+        arrays = PingArrays(
+            times=np.arange(minutes, dtype=np.int64) * 60_000_000,
+            codes=np.repeat(np.arange(12), minutes // 12 + 1)[:minutes]
+            ^ (rng.random(minutes) < 0.1),
+            states=np.array([f"S{i}" for i in range(13)], dtype=object),
+        )
+
+        start_time = time.perf_counter()
+        votes, confidence = MajorityVoteModel().vote(arrays)
+        execution_time = time.perf_counter() - start_time
+
+        self.assertLess(execution_time, 1.0)
+        self.assertEqual(len(votes), minutes)
+        self.assertTrue(((confidence > 0) & (confidence <= 1)).all())
+
+    def test_hmm_decodes_million_pings(self):
+        """Test that a million pings are decoded in under a second"""
+        import time
+        import numpy as np
+
+        n = 1_000_000
+        rng = np.random.default_rng(0)
+        truth = np.repeat(np.arange(4), n // 4)
+        arrays = PingArrays(
+            times=np.cumsum(rng.integers(1, 600, n)) * 1_000_000,
+            codes=np.where(rng.random(n) < 0.1, rng.integers(0, 4, n), truth),
+            states=np.array(["NY", "NJ", "CT", "PA"], dtype=object),
+        )
+
+        start_time = time.perf_counter()
+        path, confidence = HMMModel().decode(arrays, rng.random(n) * 5)
+        execution_time = time.perf_counter() - start_time
+
+        self.assertLess(execution_time, 1.0)
+        self.assertGreater((path == truth).mean(), 0.99)
+        self.assertTrue(((confidence > 0) & (confidence <= 1)).all())
+
+    def test_clustering_backends(self):
+        """Benchmark scikit-learn against PostGIS clustering on the same pings"""
+        import time
+        import numpy as np
+
+        stays, per_stay = 40, 500
+        rng = np.random.default_rng(0)
+        now = timezone.now()
+        # stays ~5 km apart, pings within ~100 m of the stay's centre
+        centres = np.column_stack((-74.0 + np.arange(stays) * 0.06, np.full(stays, 40.7)))
+        jitter = rng.normal(scale=0.0005, size=(stays * per_stay, 2))
+        SubscriberPing.objects.bulk_create(
+            SubscriberPing(
+                subscriber=self.subscriber,
+                utc_time=now + timedelta(minutes=i),
+                cell_type=SubscriberPing.CellType.DATA,
+                geom=Point(*(centres[i // per_stay] + jitter[i])),
+                state=self.state,
+            )
+            for i in range(stays * per_stay)
+        )
+        pings_queryset = SubscriberPing.objects.filter(subscriber=self.subscriber)
+
+        timings, timelines = {}, {}
+        for algorithm in [ClusteringModel(), SqlClusteringModel()]:
+            start_time = time.perf_counter()
+            intervals = algorithm.infer_intervals(self.subscriber, pings=pings_queryset)
+            timings[algorithm.name] = time.perf_counter() - start_time
+            timelines[algorithm.name] = [
+                (i.state_id, i.ping_count, i.interval_start, i.interval_end) for i in intervals
+            ]
+
+        python_time, sql_time = timings.values()
+        logger.info("Clustering %d pings: %s", stays * per_stay,
+                    ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
+        python_timeline, sql_timeline = timelines.values()
+        self.assertEqual(sql_timeline, python_timeline)
+        self.assertEqual(sum(count for _, count, _, _ in sql_timeline), stays * per_stay)
+        for name, execution_time in timings.items():
+            self.assertLess(execution_time, 10.0, msg=f"{name}: {timings}")
+        # clustering in the database must stay in the same league as
+        # fetching every ping and clustering it in Python
+        self.assertLess(sql_time / python_time, 5.0, msg=f"{timings}")
+
+    def test_flat_serializers_throughput(self):
+        """Test that the flat serializers render 100k rows at least 5x faster"""
+        import time
+
+        n = 100_000
+        now = timezone.now()
+        SubscriberPing.objects.bulk_create(
+            (
+                SubscriberPing(
+                    subscriber=self.subscriber,
+                    utc_time=now + timedelta(seconds=i),
+                    cell_type=SubscriberPing.CellType.DATA,
+                    geom=Point(0.5 + (i % 100) * 1e-4, 0.5),
+                    state=self.state,
+                )
+                for i in range(n)
+            ),
+            batch_size=10_000,
+        )
+        pings = SubscriberPing.objects.filter(subscriber=self.subscriber)
+        intervals = [
+            LocationInterval(
+                subscriber=self.subscriber,
+                interval_start=now + timedelta(minutes=i),
+                interval_end=now + timedelta(minutes=i + 1),
+                ping_count=1,
+                state=self.state,
+                confidence_pct=87.5,
+                method=LocationInterval.Method.MAJORITY_VOTE,
+            )
+            for i in range(n)
+        ]
+
+        def timed(render):
+            start_time = time.perf_counter()
+            rows = render()
+            return time.perf_counter() - start_time, rows
+
+        cases = [
+            ("pings", lambda: SubscriberPingSerializer(list(pings), many=True).data,
+             lambda: FlatSubscriberPingSerializer(pings).data),
+            ("intervals", lambda: LocationIntervalSerializer(intervals, many=True).data,
+             lambda: FlatIntervalSerializer(intervals).data),
+        ]
+        for name, model_serializer, flat_serializer in cases:
+            model_time, model_rows = timed(model_serializer)
+            flat_time, flat_rows = timed(flat_serializer)
+
+            self.assertEqual(len(flat_rows), n)
+            self.assertEqual(len(model_rows), n)
+            self.assertGreaterEqual(model_time / flat_time, 5, msg=f"{name}: {model_time:.2f}s vs {flat_time:.2f}s")
+
+        ping = FlatSubscriberPingSerializer(pings.order_by("ping_id")[:1]).data[0]
+        self.assertEqual(ping["subscriber"], self.subscriber.id)
+        self.assertAlmostEqual(ping["lon"], 0.5)
+        self.assertEqual(FlatIntervalSerializer(intervals[:1]).data[0]["confidence_pct"],
+                         LocationIntervalSerializer(intervals[0]).data["confidence_pct"])
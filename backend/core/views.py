@@ -1,12 +1,35 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled
 from rest_framework.serializers import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from core.algorithms import LocationInferenceModel
+from core import exports, inference_cache
+from core.algorithms import LocationInferenceModel, stored_intervals, stored_timeline
+from core.ingestion import (
+    QueueFull,
+    get_ingest_queue,
+    ingest_records,
+    iter_json_records,
+    queue_row,
+    upsert_ping,
+)
 from core.filters import SubscriberFilter, SubscriberPingQueryFilter
-from core.serializers import LocationIntervalSerializer, StateSerializer, SubscriberSerializer, SubscriberPingSerializer
+from core.pagination import FlatPingPagination, PingPagination, SubscriberPagination, sample_pings
+from core.renderers import DATA_RENDERERS
+from core.serializers import (
+    FlatStateSerializer,
+    InferenceSerializer,
+    StateSerializer,
+    SubscriberPingSerializer,
+    SubscriberSerializer,
+)
 from core.models import (
     LocationInterval,
     State,
@@ -14,41 +37,211 @@ from core.models import (
     SubscriberPing,
 )
 
+# include_pings values of /infer/: no pings, an even sample, the first page
+# of pings, or only the URL of the first page
+INCLUDE_PINGS = ("none", "sample", "page", "cursor")
+DEFAULT_PING_LIMIT = 100
+
+
+def ping_limit(request) -> int:
+    limit = request.query_params.get("ping_limit", DEFAULT_PING_LIMIT)
+    maximum = settings.PAGINATION["PING_MAX_PAGE_SIZE"]
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = 0
+    if not 1 <= limit <= maximum:
+        raise ValidationError({"ping_limit": f"Must be an integer between 1 and {maximum}."})
+    return limit
+
+
+def inference_model(request) -> LocationInferenceModel:
+    model_id = request.query_params.get("model_id", LocationInterval.Method.MAJORITY_VOTE)
+    try:
+        model_id = int(model_id)
+    except (TypeError, ValueError):
+        raise ValidationError({"model_id": "Invalid model_id parameter. Must be an integer."})
+    return LocationInferenceModel.get(model_id)
+
+
+def subscriber_pings(request, subscriber):
+    """
+    The subscriber's pings matching the request's filters, and whether any
+    filter applies: stored timelines only answer unfiltered requests.
+    """
+    filterset = SubscriberPingQueryFilter(request.query_params, subscriber.pings.all())
+    filtered = any(request.query_params.get(name) for name in filterset.filters)
+    return filterset.qs, filtered
+
+
 class StateViewSet(viewsets.ModelViewSet):
     queryset = State.objects.all()
     serializer_class = StateSerializer
 
+    def list(self, request, *args, **kwargs):
+        return Response(FlatStateSerializer(self.filter_queryset(self.get_queryset())).data)
+
 class SubscriberViewSet(viewsets.ModelViewSet):
     queryset = Subscriber.objects.all()
     serializer_class = SubscriberSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = SubscriberFilter
+    pagination_class = SubscriberPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *DATA_RENDERERS]
 
     @action(
         detail=True, 
         methods=['get'],
-        serializer_class=LocationIntervalSerializer,
+        serializer_class=InferenceSerializer,
         url_path='infer',
     )
     def infer(self, request, pk=None):
         subscriber = self.get_object()
-        subscriber_pings = subscriber.pings.all()
-        # Apply SubscriberPingQueryFilter to subscriber_pings queryset
-        
-        filtered_pings = SubscriberPingQueryFilter(request.query_params, subscriber_pings).qs
-
-        model_id = request.query_params.get("model_id", LocationInterval.Method.MAJORITY_VOTE)
-        try:
-            model_id = int(model_id)
-        except (TypeError, ValueError):
-            raise ValidationError({"model_id": "Invalid model_id parameter. Must be an integer."})
-
-        algorithm = LocationInferenceModel.get(model_id)
-        
-        interval = algorithm.infer_intervals(subscriber, pings=filtered_pings)
-        serializer = self.get_serializer(interval, context={"pings": filtered_pings})
-        return Response(serializer.data)
+        algorithm = inference_model(request)
+        include_pings = request.query_params.get("include_pings", "none")
+        if include_pings not in INCLUDE_PINGS:
+            raise ValidationError({"include_pings": f"Must be one of {', '.join(INCLUDE_PINGS)}."})
+        ping_limit(request)
+
+        if not inference_cache.enabled():
+            return Response(self._infer(subscriber, algorithm), headers={"X-Cache": "BYPASS"})
+        # the key holds the subscriber's ping version, read before the pings
+        key = inference_cache.cache_key(subscriber, algorithm.method_id, request.query_params)
+        data = inference_cache.lookup(key)
+        if data is not None:
+            return Response(data, headers={"X-Cache": "HIT"})
+        data = self._infer(subscriber, algorithm)
+        inference_cache.store(key, data)
+        return Response(data, headers={"X-Cache": "MISS"})
+
+    def _infer(self, subscriber, algorithm) -> dict:
+        filtered_pings, filtered = subscriber_pings(self.request, subscriber)
+
+        # served from the materialized timeline when it already covers every
+        # ping; filtered requests are inferred over the matching pings only
+        intervals = None if filtered else stored_timeline(subscriber, algorithm.method_id, filtered_pings)
+        if intervals is None:
+            intervals = algorithm.infer_intervals(subscriber, pings=filtered_pings)
+        summary = algorithm.summarize(intervals)
+        if summary is None:
+            data = {"ping_count": 0, "intervals": []}
+        else:
+            data = self.get_serializer(summary, context={"intervals": intervals}).data
+        data.update(self._attach_pings(subscriber, filtered_pings))
+        return data
+
+    def _attach_pings(self, subscriber, pings) -> dict:
+        include_pings = self.request.query_params.get("include_pings", "none")
+        limit = ping_limit(self.request)
+        if include_pings == "sample":
+            return {"pings": sample_pings(pings, limit)}
+        if include_pings == "page":
+            rows, cursor = FlatPingPagination().page(pings, None, limit)
+            return {"pings": rows, "pings_next": self._pings_url(subscriber, cursor, limit)}
+        if include_pings == "cursor":
+            return {"pings_next": self._pings_url(subscriber, "", limit)}
+        return {}
+
+    def _pings_url(self, subscriber, cursor, limit):
+        """
+        URL of the ``pings`` page after ``cursor`` (the first page for an
+        empty one), ``None`` past the last page.
+        """
+        if cursor is None:
+            return None
+        params = {FlatPingPagination.page_size_query_param: limit}
+        if "start" in self.request.query_params:
+            params["start"] = self.request.query_params["start"]
+        if cursor:
+            params[FlatPingPagination.cursor_query_param] = cursor
+        url = reverse("subscriber-pings", kwargs={"pk": subscriber.pk})
+        return self.request.build_absolute_uri(f"{url}?{urlencode(params)}")
+
+    @action(detail=True, methods=["get"], url_path="pings")
+    def pings(self, request, pk=None):
+        """
+        Flat pings of the subscriber in time order, one keyset page at a time.
+        """
+        subscriber = self.get_object()
+        pings = SubscriberPingQueryFilter(request.query_params, subscriber.pings.all()).qs
+        paginator = FlatPingPagination()
+        rows = paginator.paginate_queryset(pings, request, view=self)
+        return paginator.get_paginated_response(rows)
+
+    @action(detail=True, methods=["get"], url_path=r"pings\.(?P<export_format>ndjson|csv)")
+    def export_pings(self, request, pk=None, export_format=None):
+        """
+        Streams every ping of the subscriber (from ``start``) in time order.
+        """
+        subscriber = self.get_object()
+        pings = SubscriberPingQueryFilter(request.query_params, subscriber.pings.all()).qs
+        return exports.stream(exports.PING_COLUMNS, exports.ping_rows(pings), export_format,
+                              f"subscriber-{subscriber.pk}-pings", using=pings.db)
+
+    @action(detail=True, methods=["get"], url_path=r"intervals\.(?P<export_format>ndjson|csv)")
+    def export_intervals(self, request, pk=None, export_format=None):
+        """
+        Streams the inferred timeline of the subscriber (``model_id``, ``start``).
+        """
+        subscriber = self.get_object()
+        algorithm = inference_model(request)
+        pings, filtered = subscriber_pings(request, subscriber)
+        intervals = None if filtered else stored_intervals(subscriber, algorithm.method_id, pings)
+        if intervals is None:
+            intervals = algorithm.infer_intervals(subscriber, pings=pings)
+        return exports.stream(exports.INTERVAL_COLUMNS, exports.interval_rows(intervals),
+                              export_format, f"subscriber-{subscriber.pk}-intervals", using=pings.db)
+
+    @action(detail=False, methods=["get"], url_path="infer-cache")
+    def infer_cache(self, request):
+        """
+        Hit/miss counters of this process' inference cache.
+        """
+        return Response(inference_cache.stats())
 
 class SubscriberPingViewSet(viewsets.ModelViewSet):
     queryset = SubscriberPing.objects.all()
-    serializer_class = SubscriberPingSerializer
\ No newline at end of file
+    serializer_class = SubscriberPingSerializer
+    pagination_class = PingPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *DATA_RENDERERS]
+
+    def list(self, request, *args, **kwargs):
+        # pages are already flat rows (PingPagination.row_serializer)
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(page)
+
+    def create(self, request, *args, **kwargs):
+        # idempotent: replaying a ping answers with the row already stored
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if settings.INGEST_QUEUE["ENABLED"]:
+            try:
+                depth = get_ingest_queue().put(queue_row(serializer.validated_data))
+            except QueueFull:
+                raise Throttled(detail="Ingest queue is full, retry later.")
+            return Response({"queued": True, "depth": depth}, status=status.HTTP_202_ACCEPTED)
+        ping_id, created = upsert_ping(serializer.validated_data)
+        serializer.instance = SubscriberPing.objects.get(pk=ping_id)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Ingests an NDJSON stream (or a JSON array) of pings in chunks and
+        answers with a summary instead of echoing the rows.
+        """
+        content_type = request.content_type.split(";")[0].strip()
+        summary = ingest_records(iter_json_records(request.stream, content_type))
+        return Response(summary.as_dict())
+
+    @action(detail=False, methods=["get"], url_path="queue")
+    def queue(self, request):
+        """
+        Depth and flush latency of this process' ingest queue.
+        """
+        if not settings.INGEST_QUEUE["ENABLED"]:
+            return Response({"enabled": False})
+        return Response({"enabled": True, **get_ingest_queue().stats()})
@@ -11,7 +11,7 @@ type Subscriber = {
     name: string;
 }
 
-type InferenceResponse = {
+type Interval = {
     interval_start: string,
     interval_end: string,
     ping_count: number,
@@ -19,13 +19,20 @@ type InferenceResponse = {
     method: number,
     subscriber: number,
     state: string,
+}
+
+type InferenceResponse = Interval & {
+    intervals: Interval[],
     pings: Array<{
-        geom: string,
+        ping_id: number,
         cell_type: string,
         utc_time: string,
         state: string,
+        lon: number,
+        lat: number,
         coordinates?: [number, number],
     }>;
+    pings_next?: string | null,
 }
 
 const ICONS = {
@@ -51,6 +58,9 @@ function Dashboard() {
     const MODELS = [
         { value: "1", label: 'Majority Vote' },
         { value: "2", label: 'Clustering' },
+        { value: "3", label: 'HMM' },
+        { value: "4", label: 'Majority Vote (SQL)' },
+        { value: "5", label: 'Clustering (PostGIS)' },
     ]
 
     const form = useForm({
@@ -66,31 +76,30 @@ function Dashboard() {
         },
     })
 
-    const parseGeomToLatLng = (geom: string): [number, number] => {
-        // Example geom: "SRID=4326;POINT (-73.57165 41.22256)"
-        const match = geom.match(/POINT\s*\(\s*([-\d.]+)\s+([-\d.]+)\s*\)/);
-        if (match) {
-            // Note: POINT (lng lat)
-            const lng = parseFloat(match[1]);
-            const lat = parseFloat(match[2]);
-            return [lat, lng];
-        }
-        // fallback to [0,0] if parsing fails
-        return [0, 0];
-    }
-
     const fetchSubscribers = async () => {
       try {
         const params = new URLSearchParams()
         if (query) {
           params.append('name', query)
         }
-        const response = await fetch(`/api/subscribers/?${params.toString()}`)
-        if (!response.ok) {
-          throw new Error('Failed to fetch subscribers')
+        const results: Subscriber[] = []
+        let url: string | null = `/api/subscribers/?${params.toString()}`
+        // the list is keyset paginated: follow `next` until the last page
+        while (url) {
+          const response = await fetch(url)
+          if (!response.ok) {
+            throw new Error('Failed to fetch subscribers')
+          }
+          const data = await response.json()
+          results.push(...data.results)
+          if (data.next) {
+            const next = new URL(data.next, window.location.origin)
+            url = `${next.pathname}${next.search}`
+          } else {
+            url = null
+          }
         }
-        const data = await response.json()
-        setSubscribers(data)
+        setSubscribers(results)
       } catch (error) {
         console.error('Error fetching subscribers:', error)
       }
@@ -122,17 +131,18 @@ function Dashboard() {
           params.append('end', values.endTime.toISOString())
         }
         params.append('model_id', values.model)
+        // an even sample of the pings is enough for the map
+        params.append('include_pings', 'sample')
+        params.append('ping_limit', '100')
         const response = await fetch(`/api/subscribers/${values.subscriberId}/infer/?${params.toString()}`)
         if (!response.ok) {
           throw new Error('Failed to fetch subscribers')
         }
         const data = await response.json()
-        data.pings = data.pings.map((ping: any) => ({
+        data.pings = (data.pings ?? []).map((ping: any) => ({
           ...ping,
-          coordinates: parseGeomToLatLng(ping.geom),
+          coordinates: [ping.lat, ping.lon],
         }))
-        data.pings = data.pings.filter((ping: any) => ping.coordinates && ping.coordinates.length === 2);
-        data.pings = data.pings.slice(0, 100); // Limit to 100 pings for performance
         setInferenceResult(data)
         setColor(colorPalette(data.confidence_pct));
       } catch (error) {
@@ -171,6 +181,11 @@ function Dashboard() {
                 <Text fw={500} size="lg" mt="md">
                   Predicted state: {inferenceResult.state} ({inferenceResult.confidence_pct}% confidence) 
                 </Text>
+                {inferenceResult.intervals.map((interval, index) => (
+                  <Text key={index} size="sm" c="dimmed">
+                    {new Date(interval.interval_start).toLocaleString()} – {new Date(interval.interval_end).toLocaleString()}: {interval.state} ({interval.ping_count} pings, {interval.confidence_pct}%)
+                  </Text>
+                ))}
                 <Card.Section>
                   <div style={{ height: '400px' }}>
                     <MapContainer 